@@ -0,0 +1,92 @@
+"""Compare host CPU spent on attachments in 'extract' and 'native' mode.
+
+Run from the discord-bot directory with sample files:
+
+    python -m benchmarks.attachment_cpu scan.pdf report.pdf photo.jpg
+
+Extract mode runs what the bot does today (PyPDF2, then OCR for scanned PDFs and
+images); native mode only downscales images and cuts PDFs to the page limit. CPU
+includes child processes (Tesseract, pdftoppm and the OCR worker pool), so the
+numbers are what the host pays, not just this interpreter.
+"""
+import argparse
+import asyncio
+import mimetypes
+import resource
+import time
+from pathlib import Path
+
+from bot.file_processor import FileProcessor
+from bot.native_attachments import NativeAttachments
+from bot.ocr import OcrService
+
+
+def cpu_seconds() -> float:
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+async def extract(processor: FileProcessor, path: Path, mime_type: str) -> int:
+    with open(path, 'rb') as file:
+        if mime_type == 'application/pdf':
+            content = await asyncio.get_running_loop().run_in_executor(None, processor._process_pdf_sync, file)
+            if content == processor.SCANNED_PDF:
+                content = await processor.ocr.pdf_to_text(file, processor.config['MAX_CONTENT_LENGTH'])
+        else:
+            content = await processor._analyze_image_file(file)
+    return len(content)
+
+
+def native(encoder: NativeAttachments, path: Path, mime_type: str) -> int:
+    with open(path, 'rb') as file:
+        block, _ = encoder.block_for(mime_type, file, path.name)
+    return len(block['source']['data']) if block else 0
+
+
+def measure(run) -> tuple:
+    start_cpu, start_wall = cpu_seconds(), time.perf_counter()
+    size = run()
+    return cpu_seconds() - start_cpu, time.perf_counter() - start_wall, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('files', nargs='+', type=Path)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    encoder = NativeAttachments()
+    print(f"{'file':40} {'mode':8} {'cpu s':>8} {'wall s':>8} {'output':>10}")
+    totals = {'extract': 0.0, 'native': 0.0}
+    for path in args.files:
+        mime_type = mimetypes.guess_type(path.name)[0] or ''
+        if not (mime_type == 'application/pdf' or mime_type.startswith('image/')):
+            print(f"{path.name:40} skipped ({mime_type or 'unknown type'})")
+            continue
+
+        for _ in range(args.repeat):
+            # A fresh OCR service per run so the page cache and image index do not hide the cost;
+            # shutting the pool down lets its CPU show up under RUSAGE_CHILDREN
+            ocr = OcrService()
+            processor = FileProcessor(ocr=ocr)
+
+            def run_extract():
+                try:
+                    return asyncio.run(extract(processor, path, mime_type))
+                finally:
+                    ocr.shutdown(wait=True)
+
+            for mode, run in (('extract', run_extract), ('native', lambda: native(encoder, path, mime_type))):
+                cpu, wall, size = measure(run)
+                totals[mode] += cpu
+                print(f"{path.name[:40]:40} {mode:8} {cpu:8.2f} {wall:8.2f} {size:10}")
+
+    if totals['extract']:
+        saved = totals['extract'] - totals['native']
+        print(f"\nTotal CPU: extract {totals['extract']:.2f}s, native {totals['native']:.2f}s "
+              f"({saved / totals['extract']:.0%} saved)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,57 @@
+from .startup import startup_timer
+from .answer_cache import AnswerCache
+from .attachment_prefetcher import AttachmentPrefetcher
 from .discord_client import ZoochiniBot
 from .message_handler import MessageHandler
 from .claude_client import ClaudeClient
 from .file_processor import FileProcessor
+from .drive_mirror import DriveMirror
 from .drive_processor import DriveProcessor
+from .loop_monitor import LoopMonitor
+from .memory_budget import MemoryBudget
+from .model_router import ModelRouter
+from .native_attachments import NativeAttachments
+from .ocr import OcrService
+import config
 from config import DISCORD_TOKEN, ANTHROPIC_API_KEY
 
 
 def main():
+    startup_timer.mark("imports")
     print("Starting bot...")
 
-    file_processor = FileProcessor()
-    # No need to specify credentials_dir - it will use parent directory by default
-    drive_processor = DriveProcessor()
-    claude_client = ClaudeClient(ANTHROPIC_API_KEY)
+    # Drive and OCR are optional subsystems; their libraries load on first use
+    ocr = None
+    if getattr(config, 'ENABLE_OCR', True):
+        ocr = OcrService(
+            pdf_dpi=getattr(config, 'OCR_PDF_DPI', 200),
+            max_workers=getattr(config, 'OCR_WORKERS', None),  # None: available CPUs, at most 4
+            match_distance=getattr(config, 'OCR_MATCH_DISTANCE', 4))
+    # One budget for every download and decode in the process
+    memory_budget = MemoryBudget(getattr(config, 'MEMORY_BUDGET_MB', 256) * 1024 * 1024)
+    # 'native' sends PDFs and images to Claude as-is; 'extract' reads them locally with PyPDF2 and OCR
+    native = None
+    if getattr(config, 'ATTACHMENT_MODE', 'extract') == 'native':
+        native = NativeAttachments(max_pdf_pages=getattr(config, 'NATIVE_MAX_PDF_PAGES', 100))
+    file_processor = FileProcessor(ocr=ocr, memory_budget=memory_budget, native=native)
+    drive_processor = None
+    if getattr(config, 'ENABLE_DRIVE', True):
+        # No need to specify credentials_dir - it will use parent directory by default
+        mirror = DriveMirror() if getattr(config, 'DRIVE_MIRROR', True) else None
+        drive_processor = DriveProcessor(ocr=ocr, memory_budget=memory_budget, mirror=mirror, native=native)
+    # Per-guild model overrides: {guild_id: 'fast' | 'standard' | 'long' | {'model': ..., 'max_tokens': ...}}
+    router = ModelRouter(getattr(config, 'MODEL_ROUTE_OVERRIDES', {}))
+    claude_client = ClaudeClient(ANTHROPIC_API_KEY, router)
+    answer_cache = AnswerCache(ttl=getattr(config, 'ANSWER_CACHE_TTL_MINUTES', 60) * 60)
     message_handler = MessageHandler(
-        claude_client, file_processor, drive_processor)
-    bot = ZoochiniBot(message_handler)
+        claude_client, file_processor, drive_processor, answer_cache=answer_cache)
+    loop_monitor = LoopMonitor(stall_threshold=getattr(config, 'LOOP_STALL_MS', 250) / 1000)
+    # Opted-in guilds: {guild_id: [channel_id, ...]}, or an empty list to watch every channel
+    prefetcher = AttachmentPrefetcher(
+        file_processor, getattr(config, 'PREFETCH_GUILDS', {}), getattr(config, 'PREFETCH_PER_MINUTE', 10))
+    bot = ZoochiniBot(message_handler, loop_monitor, prefetcher)
     bot.setup_commands()
+    startup_timer.mark("init")
     bot.run(DISCORD_TOKEN)
 
 
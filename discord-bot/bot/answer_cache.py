@@ -0,0 +1,62 @@
+import hashlib
+import re
+import time
+from collections import OrderedDict
+
+
+class AnswerCache:
+    """Claude answers for Drive questions, reused while the files they read are unchanged.
+
+    Entries are keyed by command, the normalized question and a fingerprint of the
+    Drive files involved (ids plus modifiedTime), so an edit to any of them makes the
+    old answer unreachable. Entries expire after a TTL and the least recently used
+    are evicted past max_entries.
+    """
+
+    def __init__(self, ttl: float = 3600, max_entries: int = 500):
+        self.config = {
+            'TTL': ttl,  # seconds
+            'MAX_ENTRIES': max_entries
+        }
+        self._entries = OrderedDict()  # key -> (stored at, answer)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        """Lowercase, drop punctuation and collapse whitespace so trivial rewordings match"""
+        return " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+
+    @staticmethod
+    def fingerprint(files: list, extra: str = "") -> str:
+        """Digest of the files' ids and modification times"""
+        parts = sorted(f"{file['id']}:{file.get('modifiedTime') or ''}" for file in files)
+        return hashlib.sha256("|".join([extra] + parts).encode()).hexdigest()
+
+    def key(self, command: str, question: str, fingerprint: str) -> str:
+        return f"{command}:{fingerprint}:{self.normalize(question)}"
+
+    def get(self, key: str):
+        """(answer, age in seconds) for a live entry, or (None, None)"""
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] > self.config['TTL']:
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None, None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1], time.monotonic() - entry[0]
+
+    def put(self, key: str, answer: str):
+        self._entries[key] = (time.monotonic(), answer)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.config['MAX_ENTRIES']:
+            self._entries.popitem(last=False)
+
+    def describe(self) -> str:
+        lookups = self.hits + self.misses
+        rate = f"{self.hits / lookups:.0%}" if lookups else "n/a"
+        return (f"Answer cache: {len(self._entries)} entries, {self.hits} hits / {self.misses} misses "
+                f"(hit rate {rate})")
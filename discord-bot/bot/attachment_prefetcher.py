@@ -0,0 +1,80 @@
+import asyncio
+import time
+from collections import deque
+from .file_processor import FileProcessor
+
+
+class AttachmentPrefetcher:
+    """Extract attachments in the background as they are posted, so /ask finds them ready.
+
+    Only guilds that opt in are watched, optionally limited to some channels. Each guild
+    has a per-minute allowance; anything over it, or over the queue size, is skipped and
+    simply extracted on demand later. A single worker with a pause between files keeps
+    this behind interactive work.
+    """
+
+    def __init__(self, file_processor: FileProcessor, guilds: dict = None, per_minute: int = 10):
+        self.file_processor = file_processor
+        # guild id -> list of channel ids to watch, or an empty list for every channel
+        self.guilds = guilds or {}
+        self.config = {
+            'PER_MINUTE': per_minute,  # Attachments queued per guild per minute
+            'QUEUE_SIZE': 100,
+            'IDLE_DELAY': 1.0  # seconds between files
+        }
+        self._queue = asyncio.Queue(maxsize=self.config['QUEUE_SIZE'])
+        self._recent = {}  # guild id -> deque of queue times
+        self._task = None
+        self.skipped = 0
+        self.done = 0
+
+    def start(self):
+        if self.guilds and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._worker())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def watches(self, message) -> bool:
+        if message.guild is None or message.guild.id not in self.guilds:
+            return False
+        channels = self.guilds[message.guild.id]
+        return not channels or message.channel.id in channels
+
+    def offer(self, message):
+        """Queue a new message's attachments if its guild opted in and has allowance left"""
+        if not message.attachments or not self.watches(message):
+            return
+
+        recent = self._recent.setdefault(message.guild.id, deque())
+        now = time.monotonic()
+        while recent and now - recent[0] >= 60:
+            recent.popleft()
+
+        for attachment in message.attachments:
+            if len(recent) >= self.config['PER_MINUTE'] or self._queue.full():
+                self.skipped += 1
+                continue
+            recent.append(now)
+            self._queue.put_nowait(attachment)
+
+    async def _worker(self):
+        while True:
+            attachment = await self._queue.get()
+            try:
+                # Goes through the result cache, so a later /ask reuses this work
+                await self.file_processor.get_file_content(attachment)
+                self.done += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Prefetching {attachment.filename} failed: {e}")
+            await asyncio.sleep(self.config['IDLE_DELAY'])
+
+    def describe(self) -> str:
+        if not self.guilds:
+            return "Attachment prefetch: off"
+        return (f"Attachment prefetch: {len(self.guilds)} guild(s), {self.done} extracted, "
+                f"{self._queue.qsize()} waiting, {self.skipped} skipped over limits")
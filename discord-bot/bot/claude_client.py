@@ -1,50 +1,114 @@
 import asyncio
+import time
 from asyncio import Lock
-from anthropic import Anthropic
 from datetime import datetime, timedelta
 from typing import Optional, ClassVar
+from .model_router import ModelRouter
+from .resilience import Backend, retry_budget
+from .startup import lazy_import
 
 
 class ClaudeClient:
     _global_lock: ClassVar[Lock] = Lock()
     _last_call: ClassVar[Optional[datetime]] = None
 
-    def __init__(self, api_key: str):
-        self.client = Anthropic(api_key=api_key)
+    def __init__(self, api_key: str, router: ModelRouter = None):
+        self.api_key = api_key
+        self.router = router or ModelRouter()
+        self._client = None
         self.last_call = None
         self.RATE_LIMIT = 0.5  # seconds between calls
+        self.backend = Backend('Claude', retry_budget)
 
-    async def get_response(self, username: str, question: str, history: str) -> Optional[str]:
-        async with self._global_lock:  # Global rate limiting
+    @property
+    def client(self):
+        # The anthropic SDK is slow to import, so load it with the first request
+        if self._client is None:
+            # Retries belong to self.backend so they count against the shared retry budget
+            self._client = lazy_import('anthropic').Anthropic(api_key=self.api_key, max_retries=0)
+        return self._client
+
+    async def get_response(self, username: str, question: str, history: str, command: str = 'ask',
+                           guild_id: int = None, user_question: str = None,
+                           attachments: list = None) -> Optional[str]:
+        """Answer a question; user_question is the user's own words when question embeds documents.
+
+        attachments are image/document content blocks sent ahead of the text prompt.
+        """
+        prompt = f"""Recent conversation history: {history}
+                    Current user {username} asks: {question}
+                    Please consider the conversation history above when answering."""
+        route = self.router.route(command, user_question or question, len(prompt), guild_id,
+                                  has_attachments=bool(attachments))
+        content = [*attachments, {"type": "text", "text": prompt}] if attachments else prompt
+        return await self._complete(content, route)
+
+    async def summarize(self, summary: str, messages: str, max_chars: int) -> Optional[str]:
+        """Fold new chat messages into an existing running summary"""
+        prompt = f"""You maintain a running summary of a Discord channel so that later questions keep their context.
+
+Current summary:
+{summary or "(none yet)"}
+
+New messages, oldest first:
+{messages}
+
+Rewrite the summary so it also covers the new messages. Keep names, decisions, open questions, file names and facts people may ask about later. Drop greetings and small talk. Reply with the summary only, under {max_chars} characters."""
+        # Summaries are simple rewrites, so they use the fast model; roughly 4 characters per token, with headroom
+        route = dict(self.router.TIERS['fast'], name='summary', reason='history summary', max_tokens=max_chars // 3)
+        return await self._complete(prompt, route)
+
+    async def _complete(self, prompt, route: dict) -> Optional[str]:
+        """Send one user turn; prompt is a string or a list of content blocks"""
+        # Global rate limiting - the lock only spaces out call starts, so a slow
+        # call (such as a background summary) does not hold up everyone else
+        async with self._global_lock:
             now = datetime.now()
-            if self._last_call:
-                time_since_last = now - self._last_call
+            if ClaudeClient._last_call:
+                time_since_last = now - ClaudeClient._last_call
                 if time_since_last < timedelta(seconds=self.RATE_LIMIT):
                     await asyncio.sleep(self.RATE_LIMIT - time_since_last.total_seconds())
+            ClaudeClient._last_call = datetime.now()
 
-            for attempt in range(3):
-                try:
-                    prompt = f"""Recent conversation history: {history}
-                    Current user {username} asks: {question}
-                    Please consider the conversation history above when answering."""
+        def create():
+            # Run API call in threadpool to avoid blocking
+            return asyncio.get_event_loop().run_in_executor(
+                None,
+                lambda: self.client.messages.create(
+                    model=route['model'],
+                    max_tokens=route['max_tokens'],
+                    messages=[{"role": "user", "content": prompt}]
+                )
+            )
+
+        started = time.monotonic()
+        try:
+            message = await self.backend.call(create, self._is_retryable)
+        except Exception as e:
+            print(f"Claude API error: {str(e)}")
+            return None
 
-                    # Run API call in threadpool to avoid blocking
-                    message = await asyncio.get_event_loop().run_in_executor(
-                        None,
-                        lambda: self.client.messages.create(
-                            model="claude-3-5-sonnet-latest",
-                            max_tokens=4000,
-                            messages=[{"role": "user", "content": prompt}]
-                        )
-                    )
+        self.last_call = datetime.now()
+        stop_reason = getattr(message, 'stop_reason', None)
+        self.router.record(route, time.monotonic() - started, getattr(message, 'usage', None), stop_reason)
 
-                    self.last_call = datetime.now()
+        if stop_reason == 'max_tokens':
+            # The answer ran out of room - ask again with a larger output budget if there is one
+            larger = self.router.escalate(route)
+            if larger is not None:
+                return await self._complete(prompt, larger)
 
-                    if not message.content:
-                        return None
+        if not message.content:
+            return None
 
-                    return message.content[0].text
+        text = message.content[0].text
+        if stop_reason == 'max_tokens' and route['name'] != 'summary':
+            text += "\n\n*[Answer cut off at the length limit - ask me to continue for the rest]*"
+        return text
 
-                except Exception as e:
-                    print(f"Claude API error: {str(e)}")
-                    return None
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        """Overloaded, rate limited, server and connection errors are worth retrying"""
+        if type(error).__name__ in ('APIConnectionError', 'APITimeoutError'):
+            return True
+        return getattr(error, 'status_code', None) in (408, 409, 429, 500, 502, 503, 504, 529)
@@ -1,12 +1,16 @@
-import aiohttp
+import asyncio
+import signal
 import discord
 from discord import app_commands
+from .attachment_prefetcher import AttachmentPrefetcher
+from .loop_monitor import LoopMonitor
 from .message_handler import MessageHandler
-from .file_processor import FileProcessor
+from .startup import startup_timer
 
 
 class ZoochiniBot(discord.Client):
-    def __init__(self, message_handler: MessageHandler):
+    def __init__(self, message_handler: MessageHandler, loop_monitor: LoopMonitor = None,
+                 prefetcher: AttachmentPrefetcher = None):
         intents = discord.Intents.default()
         intents.message_content = True
         intents.messages = True
@@ -14,10 +18,90 @@ class ZoochiniBot(discord.Client):
         super().__init__(intents=intents)
         self.tree = app_commands.CommandTree(self)
         self.message_handler = message_handler
-        self.file_processor = FileProcessor()
+        self.drive_processor = message_handler.drive_processor
+        self.loop_monitor = loop_monitor or LoopMonitor()
+        # Does nothing unless some guild opted in to background attachment extraction
+        self.prefetcher = prefetcher or AttachmentPrefetcher(message_handler.file_processor)
+        self.config = {'SIGNAL_PROFILE_SECONDS': 30}
 
     async def setup_hook(self):
-        await self.tree.sync()
+        startup_timer.mark("login")
+        await self.loop_monitor.start()
+        self.prefetcher.start()
+        try:
+            # `kill -USR1 <pid>` captures a profile without going through Discord
+            asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, self._profile_from_signal)
+        except (NotImplementedError, AttributeError):
+            pass  # No signal support on this platform
+        # Drive auth and service construction happen here, off the first user's critical path
+        tasks = [self.tree.sync()]
+        if self.drive_processor:
+            tasks.append(self.drive_processor.start())
+        await asyncio.gather(*tasks)
+        if self.drive_processor:
+            print(self.drive_processor.readiness())
+        # Resume jobs left unfinished by the previous process
+        await self.message_handler.job_queue.start(self._post_to_channel)
+        startup_timer.mark("setup_hook")
+
+    async def _post_to_channel(self, channel_id: int, text: str, prefix: str = ""):
+        """Deliver background job output to a channel"""
+        channel = self.get_channel(channel_id) or await self.fetch_channel(channel_id)
+        await self.message_handler.response_sender.send_channel(channel, text, prefix)
+
+    async def on_message(self, message: discord.Message):
+        if message.author.bot:
+            return
+        self.prefetcher.offer(message)
+
+    async def on_ready(self):
+        if not startup_timer.reported:
+            startup_timer.mark("gateway connect")
+            startup_timer.reported = True
+            print(startup_timer.report())
+
+    def _profile_from_signal(self):
+        async def run():
+            try:
+                path = await self.loop_monitor.profile(self.config['SIGNAL_PROFILE_SECONDS'])
+                print(f"Profile written to {path}")
+            except Exception as e:
+                print(f"Profiling failed: {e}")
+        asyncio.create_task(run())
+
+    async def close(self):
+        self.loop_monitor.stop()
+        self.prefetcher.stop()
+        await self.message_handler.job_queue.stop()
+        if self.drive_processor:
+            await self.drive_processor.stop()
+        if self.message_handler.file_processor.ocr:
+            self.message_handler.file_processor.ocr.shutdown()
+        await self.message_handler.cleanup()
+        await super().close()
+
+    def status_report(self) -> str:
+        """Collect readiness of the bot's subsystems"""
+        lines = [f"Gateway latency: {round(self.latency * 1000)}ms"]
+        if self.drive_processor:
+            lines.append(self.drive_processor.readiness())
+            if self.drive_processor.mirror is not None:
+                lines.append(self.drive_processor.mirror.describe())
+        else:
+            lines.append("Drive: disabled")
+        ocr = self.message_handler.file_processor.ocr
+        lines.append(ocr.image_index.describe() if ocr else "OCR: disabled")
+        lines.append(self.loop_monitor.describe())
+        lines.append(self.message_handler.file_processor.memory_budget.describe())
+        lines.append(self.message_handler.file_processor.describe())
+        lines.append(self.prefetcher.describe())
+        lines.append(self.message_handler.job_queue.describe())
+        lines.append(self.message_handler.claude_client.backend.describe())
+        lines.append(self.message_handler.claude_client.router.describe())
+        lines.append(self.message_handler.answer_cache.describe())
+        if self.drive_processor:
+            lines.append(self.drive_processor.backend.describe())
+        return "\n".join(lines)
 
     def setup_commands(self):
         @self.tree.command(name="ping", description="Check the bot's latency")
@@ -25,6 +109,16 @@ class ZoochiniBot(discord.Client):
             latency = round(self.latency * 1000)
             await interaction.response.send_message(f'Pong! Latency: {latency}ms')
 
+        @self.tree.command(name="status", description="Admin: show the bot's subsystem status")
+        @app_commands.guild_only()
+        @app_commands.default_permissions(administrator=True)
+        async def status(interaction: discord.Interaction):
+            # Internal state and raw Drive errors are for administrators only, and only for their eyes
+            if interaction.guild is None or not interaction.user.guild_permissions.administrator:
+                await interaction.response.send_message("This command is for server administrators.", ephemeral=True)
+                return
+            await interaction.response.send_message(self.status_report(), ephemeral=True)
+
         @self.tree.command(name="ask", description="Ask Claude a question with optional image/file")
         @app_commands.describe(
             question="Your question for Claude",
@@ -33,22 +127,59 @@ class ZoochiniBot(discord.Client):
         async def ask(interaction: discord.Interaction, question: str, file: discord.Attachment = None):
             await self.message_handler.handle_ask_command(interaction, question, file)
 
+        @self.tree.command(name="profile", description="Admin: sample the bot for N seconds and upload a flamegraph file")
+        @app_commands.guild_only()
+        @app_commands.default_permissions(administrator=True)
+        @app_commands.describe(seconds="How long to sample (1-120)")
+        async def profile(interaction: discord.Interaction, seconds: app_commands.Range[int, 1, 120] = 15):
+            # A DM has no guild permissions to check, so refuse there as well
+            if interaction.guild is None or not interaction.user.guild_permissions.administrator:
+                await interaction.response.send_message("This command is for server administrators.", ephemeral=True)
+                return
+            await interaction.response.defer(ephemeral=True)
+            try:
+                path = await self.loop_monitor.profile(seconds)
+            except RuntimeError as e:
+                await interaction.followup.send(str(e), ephemeral=True)
+                return
+            stalls = list(self.loop_monitor.stalls)[-3:]
+            summary = self.loop_monitor.describe()
+            for when, lag, stack in stalls:
+                last_frame = stack.strip().splitlines()[-2:] if stack else []
+                summary += f"\n{when:%H:%M:%S} blocked {lag * 1000:.0f}ms: {' '.join(line.strip() for line in last_frame)}"
+            await interaction.followup.send(
+                summary[:1900], file=discord.File(path), ephemeral=True)
+
+        @self.tree.command(name="jobs", description="Show your recent background jobs")
+        async def jobs(interaction: discord.Interaction):
+            await self.message_handler.handle_jobs_command(interaction)
+
+        @self.tree.command(name="cancel_job", description="Cancel one of your queued or running jobs")
+        async def cancel_job(interaction: discord.Interaction, job_id: int):
+            await self.message_handler.handle_cancel_job_command(interaction, job_id)
+
+        if self.drive_processor is None:
+            return  # Drive commands are only registered when the subsystem is enabled
+
         @self.tree.command(name="ask_drive", description="Ask Claude about a Google Drive document")
-        async def ask_drive(interaction: discord.Interaction, doc_id: str, question: str):
-            await self.message_handler.handle_ask_drive_command(interaction, doc_id, question)
+        @app_commands.describe(fresh="Ignore a cached answer and ask Claude again")
+        async def ask_drive(interaction: discord.Interaction, doc_id: str, question: str, fresh: bool = False):
+            await self.message_handler.handle_ask_drive_command(interaction, doc_id, question, fresh)
 
         @self.tree.command(name="list_folder", description="List contents of a Google Drive folder")
         async def list_folder(interaction: discord.Interaction, folder_id: str):
             await self.message_handler.handle_list_folder_command(interaction, folder_id)
 
         @self.tree.command(name="ask_folder", description="Ask Claude about all documents in a folder")
-        async def ask_folder(interaction: discord.Interaction, folder_id: str, question: str):
-            await self.message_handler.handle_ask_folder_command(interaction, folder_id, question)
+        @app_commands.describe(fresh="Ignore a cached answer and ask Claude again")
+        async def ask_folder(interaction: discord.Interaction, folder_id: str, question: str, fresh: bool = False):
+            await self.message_handler.handle_ask_folder_command(interaction, folder_id, question, fresh)
 
         @self.tree.command(name="search_drive", description="Search for files or folders by name")
         async def search_drive(interaction: discord.Interaction, name: str, type: str = None):
             await self.message_handler.handle_search_drive_command(interaction, name, type)
 
         @self.tree.command(name="ask_about", description="Ask Claude about files matching a name")
-        async def ask_about(interaction: discord.Interaction, name: str, question: str):
-            await self.message_handler.handle_ask_about_command(interaction, name, question)
+        @app_commands.describe(fresh="Ignore a cached answer and ask Claude again")
+        async def ask_about(interaction: discord.Interaction, name: str, question: str, fresh: bool = False):
+            await self.message_handler.handle_ask_about_command(interaction, name, question, fresh)
@@ -0,0 +1,164 @@
+import json
+import sqlite3
+import threading
+import time
+from .startup import resolve_data_dir
+
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+
+def trigrams(text: str) -> set:
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class DriveMirror:
+    """Local SQLite copy of Drive file metadata with a trigram index on names.
+
+    DriveProcessor seeds it once and keeps it current from the changes feed, so
+    searches and folder listings become local queries instead of API calls.
+    """
+
+    FIELDS = 'id, name, mimeType, parents, modifiedTime, trashed'
+
+    def __init__(self, data_dir: str = None):
+        self.data_dir = resolve_data_dir(data_dir)
+        self.data_dir.mkdir(exist_ok=True)
+        path = self.data_dir / 'drive_mirror.db'
+
+        # Writes come from executor threads, reads from the event loop; WAL lets them overlap
+        self._writer = sqlite3.connect(path, check_same_thread=False)
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._writer.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                name_lower TEXT NOT NULL,
+                mime_type TEXT NOT NULL,
+                parents TEXT NOT NULL,
+                modified_time TEXT
+            );
+            CREATE TABLE IF NOT EXISTS file_parents (
+                parent_id TEXT NOT NULL,
+                file_id TEXT NOT NULL,
+                PRIMARY KEY (parent_id, file_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS name_trigrams (
+                trigram TEXT NOT NULL,
+                file_id TEXT NOT NULL,
+                PRIMARY KEY (trigram, file_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS file_parents_by_file ON file_parents (file_id);
+            CREATE INDEX IF NOT EXISTS name_trigrams_by_file ON name_trigrams (file_id);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+        self._writer.commit()
+        self._write_lock = threading.Lock()
+        self._reader = sqlite3.connect(path, check_same_thread=False)
+        self._reader.row_factory = sqlite3.Row
+        self.last_sync = None  # monotonic time of the last successful sync
+
+    @property
+    def ready(self) -> bool:
+        return self.get_meta('seeded') == '1'
+
+    def get_meta(self, key: str):
+        row = self._reader.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self._write_lock:
+            self._writer.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+            self._writer.commit()
+
+    def apply(self, files: list = (), removed_ids: list = ()):
+        """Upsert file metadata and drop removed or trashed files - blocking, meant to be run in executor"""
+        with self._write_lock:
+            cursor = self._writer.cursor()
+            for file in files:
+                if file.get('trashed'):
+                    removed_ids = list(removed_ids) + [file['id']]
+                    continue
+                self._delete(cursor, file['id'])
+                parents = file.get('parents') or []
+                cursor.execute(
+                    "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                    (file['id'], file['name'], file['name'].lower(), file['mimeType'],
+                     json.dumps(parents), file.get('modifiedTime')))
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO file_parents VALUES (?, ?)",
+                    [(parent, file['id']) for parent in parents])
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO name_trigrams VALUES (?, ?)",
+                    [(trigram, file['id']) for trigram in trigrams(file['name'])])
+            for file_id in removed_ids:
+                self._delete(cursor, file_id)
+            self._writer.commit()
+        self.last_sync = time.monotonic()
+
+    def _delete(self, cursor, file_id: str):
+        cursor.execute("DELETE FROM files WHERE id = ?", (file_id,))
+        cursor.execute("DELETE FROM file_parents WHERE file_id = ?", (file_id,))
+        cursor.execute("DELETE FROM name_trigrams WHERE file_id = ?", (file_id,))
+
+    def reset(self):
+        """Forget everything so the mirror is seeded again - blocking, meant to be run in executor"""
+        with self._write_lock:
+            self._writer.executescript(
+                "DELETE FROM files; DELETE FROM file_parents; DELETE FROM name_trigrams; DELETE FROM meta;")
+            self._writer.commit()
+
+    def search(self, query: str, file_type: str = None) -> list:
+        """Files whose name contains query (case-insensitive), using the trigram index"""
+        needle = query.lower()
+        grams = trigrams(needle)
+        if grams:
+            placeholders = ", ".join("?" for _ in grams)
+            sql = (f"SELECT f.* FROM files f JOIN ("
+                   f"  SELECT file_id FROM name_trigrams WHERE trigram IN ({placeholders}) "
+                   f"  GROUP BY file_id HAVING COUNT(*) = ?"
+                   f") t ON t.file_id = f.id WHERE instr(f.name_lower, ?) > 0")
+            params = [*grams, len(grams), needle]
+        else:
+            # Too short for trigrams - a scan is still fast locally
+            sql = "SELECT f.* FROM files f WHERE instr(f.name_lower, ?) > 0"
+            params = [needle]
+
+        if file_type == 'folder':
+            sql += " AND f.mime_type = ?"
+            params.append(FOLDER_MIME_TYPE)
+        elif file_type == 'document':
+            sql += " AND f.mime_type != ?"
+            params.append(FOLDER_MIME_TYPE)
+
+        return [self._row(row) for row in self._reader.execute(sql + " ORDER BY f.name", params)]
+
+    def list_children(self, folder_id: str) -> list:
+        rows = self._reader.execute(
+            "SELECT f.* FROM file_parents p JOIN files f ON f.id = p.file_id "
+            "WHERE p.parent_id = ? ORDER BY f.name", (folder_id,))
+        return [self._row(row) for row in rows]
+
+    def get(self, file_id: str):
+        row = self._reader.execute("SELECT * FROM files WHERE id = ?", (file_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def _row(self, row) -> dict:
+        return {
+            'id': row['id'],
+            'name': row['name'],
+            'mimeType': row['mime_type'],
+            'parents': json.loads(row['parents']),
+            'modifiedTime': row['modified_time']
+        }
+
+    def describe(self) -> str:
+        if not self.ready:
+            return "Drive mirror: seeding"
+        count = self._reader.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        age = f"{time.monotonic() - self.last_sync:.0f}s ago" if self.last_sync else "not yet this run"
+        return f"Drive mirror: {count} files, last synced {age}"
@@ -1,30 +1,48 @@
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
 from pathlib import Path
-import io
-import os
+from datetime import datetime, timedelta
+import asyncio
 import pickle
-import tempfile
-import os
-from PIL import Image
-import pytesseract
-from PyPDF2 import PdfReader
+import random
+import threading
+import time
 from asyncio import Lock
 import async_timeout
+from .drive_mirror import DriveMirror
+from .memory_budget import MemoryBudget
+from .native_attachments import NativeAttachments
+from .ocr import OcrService
+from .range_file import RangeFile, pdf_pages
+from .resilience import Backend, CircuitOpenError, retry_budget
+from .startup import lazy_import
 
 
 class DriveProcessor:
     SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
+    # Placeholders for reads that failed and may work on a later try
+    TRANSIENT_ERRORS = ("[Error reading ", "[Timed out waiting to read ", "[Error accessing folder contents")
+
+    def __init__(self, credentials_dir: str = None, ocr: OcrService = None, memory_budget: MemoryBudget = None,
+                 mirror: DriveMirror = None, native: NativeAttachments = None):
+        # OCR is optional - without it Drive images are reported rather than read
+        self.ocr = ocr
+        # Shared with FileProcessor so both draw on one process-wide budget
+        self.memory_budget = memory_budget or MemoryBudget()
+        # Optional local copy of file metadata that answers searches and listings without API calls
+        self.mirror = mirror
+        # Set in native attachment mode: PDFs and images go to Claude as-is instead of being extracted
+        self.native = native
 
-    def __init__(self, credentials_dir: str = None):
         # Config settings for limits and timeouts
         self.config = {
             'MAX_CONTENT_LENGTH': 100000,
             'TIMEOUT_SECONDS': 30,
-            'MAX_FILE_SIZE': 10 * 1024 * 1024  # 10MB
+            'MAX_FILE_SIZE': 10 * 1024 * 1024,  # 10MB
+            'MAX_IMAGE_PIXELS': 40000000,  # 40MP
+            'EXPORT_ESTIMATE': 4 * 1024 * 1024,  # Google Docs exports have no size up front
+            'MIRROR_SYNC_SECONDS': 60,
+            'RANGE_READ_MIN_SIZE': 8 * 1024 * 1024,  # Larger PDFs are read with range requests
+            'RANGE_BLOCK_SIZE': 32 * 1024,  # Most reads are small objects scattered through the file
+            'RANGE_CACHE_BLOCKS': 512
         }
 
         # If no credentials_dir provided, use parent directory of bot folder
@@ -51,58 +69,82 @@ class DriveProcessor:
                 "Please download it from Google Cloud Console and place it in the credentials directory."
             )
 
+        # Retries, circuit breaking and hedging for Drive API calls
+        self.backend = Backend('Drive', retry_budget)
+        # httplib2 connections are not thread-safe, so each executor thread keeps its own
+        self._thread_http = threading.local()
+
         # Add lock for concurrent authentication
         self._auth_lock = Lock()
         self._max_retries = 3
 
+        # Credentials are refreshed in the background before they expire
+        self.creds = None
+        self._refresh_task = None
+        self._mirror_task = None
+        self._refresh_margin = timedelta(minutes=5)
+        self.status = {
+            'state': 'not started',
+            'last_refresh': None,
+            'error': None
+        }
+
+    async def start(self):
+        """Authenticate, build the Drive service and keep the token fresh - called from setup_hook"""
+        self.status['state'] = 'starting'
+        try:
+            await self.authenticate()
+        except Exception as e:
+            self.status.update(state='error', error=str(e))
+            print(f"Drive startup failed: {e}")
+            return
+
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+        if self.mirror is not None and (self._mirror_task is None or self._mirror_task.done()):
+            self._mirror_task = asyncio.create_task(self._mirror_loop())
+
+    async def stop(self):
+        """Stop the background token refresh and mirror sync"""
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        if self._mirror_task:
+            self._mirror_task.cancel()
+            self._mirror_task = None
+
+    def readiness(self) -> str:
+        """Human readable Drive readiness for status reporting"""
+        line = f"Drive: {self.status['state']}"
+        if self.creds is not None and self.creds.expiry:
+            remaining = self.creds.expiry - datetime.utcnow()
+            line += f", token valid for {int(remaining.total_seconds() // 60)} min"
+        if self.status['error']:
+            line += f" (last error: {self.status['error']})"
+        return line
+
     async def authenticate(self):
         async with self._auth_lock:  # Prevent concurrent auth attempts
+            if self.service is not None:
+                return  # Another caller finished authenticating while we waited
+
             for attempt in range(self._max_retries):
                 try:
                     async with async_timeout.timeout(self.config['TIMEOUT_SECONDS']):
-                        creds = None
-
-                        # Keep your existing token loading
-                        if self.token_path.exists():
-                            try:
-                                with open(self.token_path, 'rb') as token:
-                                    creds = pickle.load(token)
-                            except Exception as e:
-                                print(f"Error loading token: {e}")
-                                self.token_path.unlink(missing_ok=True)
-
-                        # Keep your existing credential refresh/creation logic
-                        if not creds or not creds.valid:
-                            if creds and creds.expired and creds.refresh_token:
-                                print("Refreshing expired token...")
-                                await asyncio.get_event_loop().run_in_executor(
-                                    None,
-                                    lambda: creds.refresh(Request())
-                                )
-                            else:
-                                print("Getting new token...")
-                                flow = await asyncio.get_event_loop().run_in_executor(
-                                    None,
-                                    lambda: InstalledAppFlow.from_client_secrets_file(
-                                        str(self.credentials_path),
-                                        self.SCOPES
-                                    )
-                                )
-                                creds = await asyncio.get_event_loop().run_in_executor(
-                                    None,
-                                    lambda: flow.run_local_server(port=0)
-                                )
-
-                            # Keep token saving
-                            with open(self.token_path, 'wb') as token:
-                                pickle.dump(creds, token)
-                            print(f"Token saved to {self.token_path}")
+                        creds = await asyncio.get_event_loop().run_in_executor(
+                            None,
+                            self._load_credentials
+                        )
 
-                        # Keep service building
+                        # The bundled discovery document avoids fetching and caching it over the network
                         self.service = await asyncio.get_event_loop().run_in_executor(
                             None,
-                            lambda: build('drive', 'v3', credentials=creds)
+                            lambda: lazy_import('googleapiclient.discovery').build(
+                                'drive', 'v3', credentials=creds,
+                                static_discovery=True, cache_discovery=False)
                         )
+                        self.creds = creds
+                        self.status.update(state='ready', last_refresh=datetime.utcnow(), error=None)
                         return  # Success!
 
                 except asyncio.TimeoutError:
@@ -115,10 +157,166 @@ class DriveProcessor:
                     print(f"Auth attempt {attempt + 1} failed: {e}")
                     await asyncio.sleep(1)
 
+    def _load_credentials(self):
+        """Load, refresh or create credentials - blocking, meant to be run in executor"""
+        # Google client libraries are only needed once Drive is actually used
+        Request = lazy_import('google.auth.transport.requests').Request
+        InstalledAppFlow = lazy_import('google_auth_oauthlib.flow').InstalledAppFlow
+        creds = None
+
+        if self.token_path.exists():
+            try:
+                with open(self.token_path, 'rb') as token:
+                    creds = pickle.load(token)
+            except Exception as e:
+                print(f"Error loading token: {e}")
+                self.token_path.unlink(missing_ok=True)
+
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                print("Refreshing expired token...")
+                creds.refresh(Request())
+            else:
+                print("Getting new token...")
+                flow = InstalledAppFlow.from_client_secrets_file(
+                    str(self.credentials_path),
+                    self.SCOPES
+                )
+                creds = flow.run_local_server(port=0)
+
+            self._save_token(creds)
+
+        return creds
+
+    def _save_token(self, creds):
+        with open(self.token_path, 'wb') as token:
+            pickle.dump(creds, token)
+        print(f"Token saved to {self.token_path}")
+
+    def _refresh_credentials(self):
+        Request = lazy_import('google.auth.transport.requests').Request
+        self.creds.refresh(Request())
+        self._save_token(self.creds)
+
+    async def _refresh_loop(self):
+        """Refresh the access token shortly before it expires so no request waits on it"""
+        while True:
+            delay = 60
+            if self.creds is not None and self.creds.expiry:
+                refresh_at = self.creds.expiry - self._refresh_margin
+                delay = max((refresh_at - datetime.utcnow()).total_seconds(), 0)
+            await asyncio.sleep(delay)
+
+            if self.creds is None or not self.creds.refresh_token:
+                # Nothing to refresh with - an expired token would otherwise make the delay 0 and spin
+                await asyncio.sleep(60)
+                continue
+
+            try:
+                async with self._auth_lock:
+                    # The service shares this credentials object, so refreshing in place is enough
+                    await asyncio.get_event_loop().run_in_executor(
+                        None,
+                        self._refresh_credentials
+                    )
+                self.status.update(state='ready', last_refresh=datetime.utcnow(), error=None)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.status.update(state='degraded', error=str(e))
+                print(f"Background token refresh failed: {e}")
+                await asyncio.sleep(60)
+
+    async def _mirror_loop(self):
+        """Seed the metadata mirror once, then keep it current from the changes feed"""
+        while True:
+            try:
+                if not self.mirror.ready:
+                    await self._seed_mirror()
+                await self._sync_mirror()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                status = getattr(getattr(e, 'resp', None), 'status', None)
+                if status is not None and int(status) in (400, 404, 410):
+                    # The stored page token is no longer valid - start over from a fresh listing
+                    self.mirror.set_meta('seeded', '0')
+                print(f"Drive mirror sync failed: {e}")
+            await asyncio.sleep(self.config['MIRROR_SYNC_SECONDS'])
+
+    async def _seed_mirror(self):
+        """Copy the metadata of every file into the mirror"""
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self.mirror.reset)
+        # Take the token first so changes made while seeding are replayed afterwards
+        start = await self._execute(lambda: self.service.changes().getStartPageToken())
+
+        page_token = None
+        while True:
+            files = await self._execute(
+                lambda: self.service.files().list(
+                    q='trashed = false',
+                    spaces='drive',
+                    pageSize=1000,
+                    fields=f'nextPageToken, files({DriveMirror.FIELDS})',
+                    pageToken=page_token
+                )
+            )
+            await loop.run_in_executor(None, self.mirror.apply, files.get('files', []))
+
+            page_token = files.get('nextPageToken')
+            if not page_token:
+                break
+
+        self.mirror.set_meta('page_token', start['startPageToken'])
+        self.mirror.set_meta('seeded', '1')
+        print("Drive mirror seeded")
+
+    async def _sync_mirror(self):
+        """Apply every change since the stored page token to the mirror"""
+        page_token = self.mirror.get_meta('page_token')
+        while page_token:
+            page = await self._execute(
+                lambda: self.service.changes().list(
+                    pageToken=page_token,
+                    spaces='drive',
+                    pageSize=1000,
+                    includeRemoved=True,
+                    fields=f'nextPageToken, newStartPageToken, changes(fileId, removed, file({DriveMirror.FIELDS}))'
+                )
+            )
+            changes = page.get('changes', [])
+            await asyncio.get_event_loop().run_in_executor(
+                None,
+                self.mirror.apply,
+                [change['file'] for change in changes if not change.get('removed') and change.get('file')],
+                [change['fileId'] for change in changes if change.get('removed')]
+            )
+
+            # Store progress after every page so a restart resumes where this stopped
+            page_token = page.get('nextPageToken')
+            if page.get('newStartPageToken'):
+                self.mirror.set_meta('page_token', page['newStartPageToken'])
+            elif page_token:
+                self.mirror.set_meta('page_token', page_token)
+
     async def search_files(self, query_name: str, file_type: str = None) -> list:
         """Search for files/folders by name"""
+        if self.mirror is not None and self.mirror.ready:
+            results = []
+            for file in self.mirror.search(query_name, file_type):
+                parent = self.mirror.get(file['parents'][0]) if file['parents'] else None
+                results.append({
+                    'id': file['id'],
+                    'name': file['name'],
+                    'type': 'Folder' if file['mimeType'] == 'application/vnd.google-apps.folder' else 'File',
+                    'parent': parent['name'] if parent else "Root",
+                    'modifiedTime': file['modifiedTime']
+                })
+            return results
+
         if not self.service:
-            self.authenticate()
+            await self.authenticate()
 
         try:
             query_parts = [f"name contains '{query_name}' and trashed = false"]
@@ -134,33 +332,41 @@ class DriveProcessor:
 
             results = []
             page_token = None
+            parent_names = {}  # Matches often share a parent folder
 
             while True:
-                files = self.service.files().list(
-                    q=query,
-                    spaces='drive',
-                    fields='nextPageToken, files(id, name, mimeType, parents)',
-                    pageToken=page_token
-                ).execute()
+                files = await self._execute(
+                    lambda: self.service.files().list(
+                        q=query,
+                        spaces='drive',
+                        fields='nextPageToken, files(id, name, mimeType, parents, modifiedTime)',
+                        pageToken=page_token
+                    ),
+                    hedge=True
+                )
 
                 for file in files.get('files', []):
                     # Get parent folder name if possible
                     parent_name = "Root"
                     if file.get('parents'):
-                        try:
-                            parent = self.service.files().get(
-                                fileId=file['parents'][0],
-                                fields='name'
-                            ).execute()
-                            parent_name = parent['name']
-                        except:
-                            pass
+                        parent_id = file['parents'][0]
+                        if parent_id not in parent_names:
+                            try:
+                                parent = await self._execute(
+                                    lambda: self.service.files().get(fileId=parent_id, fields='name'),
+                                    hedge=True
+                                )
+                                parent_names[parent_id] = parent['name']
+                            except Exception:
+                                parent_names[parent_id] = parent_name
+                        parent_name = parent_names[parent_id]
 
                     results.append({
                         'id': file['id'],
                         'name': file['name'],
                         'type': 'Folder' if file['mimeType'] == 'application/vnd.google-apps.folder' else 'File',
-                        'parent': parent_name
+                        'parent': parent_name,
+                        'modifiedTime': file.get('modifiedTime')
                     })
 
                 page_token = files.get('nextPageToken')
@@ -175,8 +381,15 @@ class DriveProcessor:
 
     async def list_folder_contents(self, folder_id: str) -> list:
         """List all files in a folder"""
+        # Folders outside the mirror (such as the 'root' alias) still go to the API
+        if self.mirror is not None and self.mirror.ready and self.mirror.get(folder_id) is not None:
+            return [
+                {'id': file['id'], 'name': file['name'], 'type': file['mimeType'], 'modifiedTime': file['modifiedTime']}
+                for file in self.mirror.list_children(folder_id)
+            ]
+
         if not self.service:
-            self.authenticate()
+            await self.authenticate()
 
         try:
             results = []
@@ -185,18 +398,22 @@ class DriveProcessor:
             while True:
                 # Query for files in the specified folder
                 query = f"'{folder_id}' in parents and trashed = false"
-                files = self.service.files().list(
-                    q=query,
-                    spaces='drive',
-                    fields='nextPageToken, files(id, name, mimeType)',
-                    pageToken=page_token
-                ).execute()
+                files = await self._execute(
+                    lambda: self.service.files().list(
+                        q=query,
+                        spaces='drive',
+                        fields='nextPageToken, files(id, name, mimeType, modifiedTime)',
+                        pageToken=page_token
+                    ),
+                    hedge=True
+                )
 
                 for file in files.get('files', []):
                     results.append({
                         'id': file['id'],
                         'name': file['name'],
-                        'type': file['mimeType']
+                        'type': file['mimeType'],
+                        'modifiedTime': file.get('modifiedTime')
                     })
 
                 page_token = files.get('nextPageToken')
@@ -209,8 +426,11 @@ class DriveProcessor:
             print(f"Error listing folder contents: {str(e)}")
             return []
 
-    async def get_folder_content(self, folder_id: str) -> str:
-        """Get content of files in a folder, with folder summary at the top"""
+    async def get_folder_content(self, folder_id: str, progress=None) -> str:
+        """Get content of files in a folder, with folder summary at the top.
+
+        progress, if given, is awaited with a short status line before each file is read.
+        """
         try:
             files = await self.list_folder_contents(folder_id)
 
@@ -229,12 +449,12 @@ class DriveProcessor:
 
             # Then process file contents
             all_content = []
-            for file in files:
-                mime_type = file['type']
-
-                if mime_type != 'application/vnd.google-apps.folder':  # Skip folders as they're already listed
-                    content = await self.get_document_content(file['id'])
-                    all_content.append(f"=== {file['name']} ===\n{content}\n")
+            documents = [f for f in files if f['type'] != 'application/vnd.google-apps.folder']
+            for i, file in enumerate(documents, 1):  # Skip folders as they're already listed
+                if progress:
+                    await progress(f"Reading file {i}/{len(documents)}: {file['name']}")
+                content = await self.get_document_content(file['id'])
+                all_content.append(f"=== {file['name']} ===\n{content}\n")
 
             # Combine folder summary with file contents
             combined_content = "\n".join(folder_summary + all_content)
@@ -245,109 +465,282 @@ class DriveProcessor:
         except Exception as e:
             return f"[Error accessing folder contents: {str(e)}]"
 
+    def read_failed(self, content: str) -> bool:
+        """Whether document or folder content contains a placeholder for a failed read"""
+        return any(marker in content for marker in self.TRANSIENT_ERRORS)
+
     async def get_document_content(self, file_id: str) -> str:
         """Download and extract content from a Google Drive document"""
         if not self.service:
             await self.authenticate()
 
-        temp_files = []  # Track temporary files for cleanup
+        file_name = file_id
         try:
-            # Get file metadata to check mime type
-            file = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: self.service.files().get(fileId=file_id, fields='mimeType, name').execute()
+            # Get file metadata to check mime type and estimate memory cost
+            file = await self._execute(
+                lambda: self.service.files().get(
+                    fileId=file_id,
+                    fields='mimeType, name, size, imageMediaMetadata(width, height)'
+                ),
+                hedge=True
             )
             mime_type = file.get('mimeType', '')
             file_name = file.get('name', '')
 
-            # Handle different types of files
-            if mime_type == 'application/vnd.google-apps.document':
-                # Export Google Docs as plain text
-                response = await asyncio.get_event_loop().run_in_executor(
-                    None,
-                    lambda: self.service.files().export(
-                        fileId=file_id,
-                        mimeType='text/plain'
-                    ).execute()
-                )
-                content = response.decode('utf-8')
+            async with self.memory_budget.reserve(self._estimate_cost(file)) as reservation:
+                # Handle different types of files
+                if mime_type == 'application/vnd.google-apps.document':
+                    # Export Google Docs as plain text - not hedged, its time is mostly document size
+                    response = await self._execute(
+                        lambda: self.service.files().export(
+                            fileId=file_id,
+                            mimeType='text/plain'
+                        )
+                    )
+                    content = response.decode('utf-8')
 
-            elif mime_type == 'application/pdf':
-                content = await self._process_pdf_file(file_id, temp_files)
+                elif mime_type == 'application/pdf':
+                    content = await self._process_pdf_file(file_id, int(file.get('size') or 0), reservation)
 
-            elif mime_type.startswith('image/'):
-                content = await self._process_image_file(file_id)
+                elif mime_type.startswith('image/'):
+                    content = await self._process_image_file(file_id)
 
-            elif mime_type.startswith('text/'):
-                content = await self._process_text_file(file_id)
+                elif mime_type.startswith('text/'):
+                    content = await self._process_text_file(file_id)
 
-            else:
-                return f"[Unsupported file type: {mime_type}]"
+                else:
+                    return f"[Unsupported file type: {mime_type}]"
 
             # Truncate if too long
             if len(content) > self.config['MAX_CONTENT_LENGTH']:
                 return content[:self.config['MAX_CONTENT_LENGTH']] + "\n[Content truncated due to length]"
             return content
 
+        except asyncio.TimeoutError:
+            return f"[Timed out waiting to read {file_name} - the bot is busy, try again shortly]"
         except Exception as e:
             return f"[Error reading {file_name}: {str(e)}]"
-        finally:
-            # Clean up any temporary files
-            for temp_file in temp_files:
-                try:
-                    os.unlink(temp_file)
-                except Exception as e:
-                    print(f"Error cleaning up temporary file {temp_file}: {e}")
 
-    async def _process_pdf_file(self, file_id: str, temp_files: list) -> str:
-        # Download PDF and extract text
-        request = self.service.files().get_media(fileId=file_id)
-        file_content = io.BytesIO()
-        downloader = MediaIoBaseDownload(file_content, request)
+    async def get_file_metadata(self, file_id: str) -> dict:
+        """id, name, mimeType and modifiedTime of one file, from the mirror when it has it"""
+        if self.mirror is not None and self.mirror.ready:
+            file = self.mirror.get(file_id)
+            if file is not None:
+                return file
+        if not self.service:
+            await self.authenticate()
+        return await self._execute(
+            lambda: self.service.files().get(fileId=file_id, fields='id, name, mimeType, modifiedTime'),
+            hedge=True
+        )
+
+    async def get_native_block(self, file_id: str) -> tuple:
+        """(content block, prompt note) to send a Drive PDF or image to Claude directly.
+
+        Returns (None, None) when native mode is off or the file does not fit, so the
+        caller falls back to get_document_content.
+        """
+        if self.native is None:
+            return None, None
+        if not self.service:
+            await self.authenticate()
 
-        # Download in chunks
-        done = False
-        while not done:
-            _, done = await asyncio.get_event_loop().run_in_executor(
+        try:
+            file = await self._execute(
+                lambda: self.service.files().get(
+                    fileId=file_id,
+                    fields='mimeType, name, size, imageMediaMetadata(width, height)'
+                ),
+                hedge=True
+            )
+            mime_type = file.get('mimeType', '')
+            if not (mime_type == 'application/pdf' or mime_type.startswith('image/')):
+                return None, None
+            if int(file.get('size') or 0) > self.config['MAX_FILE_SIZE']:
+                return None, None
+
+            async with self.memory_budget.reserve(self._estimate_cost(file)):
+                with await self._download(file_id) as file_content:
+                    return await asyncio.get_event_loop().run_in_executor(
+                        None,
+                        self.native.block_for,
+                        mime_type,
+                        file_content,
+                        file.get('name', file_id)
+                    )
+        except Exception as e:
+            print(f"Could not prepare Drive file {file_id} for native passthrough: {e}")
+            return None, None
+
+    async def _execute(self, make_request, hedge: bool = False):
+        """Execute a Drive API request in the executor with retries and backoff.
+
+        make_request builds a fresh request for every attempt. hedge=True is only for
+        quick idempotent reads made for a user: a duplicate is sent if the first is slower
+        than the usual p95 of that API method.
+        """
+        def attempt():
+            # Runs on the executor thread, so it uses that thread's connection
+            return asyncio.get_event_loop().run_in_executor(
                 None,
-                downloader.next_chunk
+                lambda: make_request().execute(http=self._http())
             )
 
-        # Create temporary PDF file
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_pdf:
-            temp_pdf.write(file_content.getvalue())
-            temp_pdf.seek(0)
-            temp_files.append(temp_pdf.name)  # Add to cleanup list
-
-            # Extract text using PyPDF2
-            reader = PdfReader(temp_pdf.name)
-            content_parts = []
-
-            for page in reader.pages:
-                content_parts.append(page.extract_text())
-
-            return "\n".join(content_parts)
-
-    async def _process_image_file(self, file_id: str) -> str:
-        # Handle images using OCR
+        if hedge:
+            operation = getattr(make_request(), 'methodId', None)  # e.g. drive.files.get
+            return await self.backend.call(lambda: self.backend.hedged(attempt, operation), self._is_retryable)
+        return await self.backend.call(attempt, self._is_retryable)
+
+    def _http(self):
+        """The calling thread's authorized connection, kept alive across requests"""
+        local = self._thread_http
+        if getattr(local, 'http', None) is None or local.creds is not self.creds:
+            AuthorizedHttp = lazy_import('google_auth_httplib2').AuthorizedHttp
+            local.http = AuthorizedHttp(self.creds, http=lazy_import('httplib2').Http())
+            local.creds = self.creds
+        return local.http
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        """Rate limits, server errors and dropped connections are worth retrying"""
+        status = getattr(getattr(error, 'resp', None), 'status', None)
+        if status is not None:
+            status = int(status)
+            if status == 403:
+                return 'rateLimitExceeded' in str(error) or 'userRateLimitExceeded' in str(error)
+            return status in (408, 429, 500, 502, 503, 504)
+        return isinstance(error, (ConnectionError, TimeoutError, OSError))
+
+    def _estimate_cost(self, file: dict) -> int:
+        """Rough peak bytes held while a Drive file is downloaded and decoded"""
+        mime_type = file.get('mimeType', '')
+        size = int(file.get('size') or 0)
+        if mime_type == 'application/vnd.google-apps.document':
+            return self.config['EXPORT_ESTIMATE']
+        if mime_type == 'application/pdf':
+            if size >= self.config['RANGE_READ_MIN_SIZE']:
+                # Only the block cache is held, plus the objects parsed from it
+                return self.config['RANGE_BLOCK_SIZE'] * self.config['RANGE_CACHE_BLOCKS'] * 3
+            return size * 3  # Raw bytes, parsed objects and extracted text
+        if mime_type.startswith('image/'):
+            meta = file.get('imageMediaMetadata') or {}
+            pixels = (meta.get('width') or 0) * (meta.get('height') or 0)
+            return size + (pixels or self.config['MAX_IMAGE_PIXELS']) * 4  # Decoded RGBA pixels
+        return size * 3  # Raw bytes plus the decoded string
+
+    async def _download(self, file_id: str):
+        """Download a file into a spooled temp file, rewound and ready to read"""
         request = self.service.files().get_media(fileId=file_id)
-        file_content = io.BytesIO()
-        downloader = MediaIoBaseDownload(file_content, request)
+        file_content = self.memory_budget.spooled_file()
+        downloader = lazy_import('googleapiclient.http').MediaIoBaseDownload(file_content, request)
 
-        # Download in chunks
-        done = False
-        while not done:
-            _, done = await asyncio.get_event_loop().run_in_executor(
-                None,
-                downloader.next_chunk
+        def next_chunk():
+            # Chunks run one at a time but on any executor thread, so each takes that thread's connection
+            request.http = self._http()
+            return downloader.next_chunk()
+
+        # Download in chunks; a failed chunk is retried from where it stopped
+        try:
+            done = False
+            while not done:
+                _, done = await self.backend.call(
+                    lambda: asyncio.get_event_loop().run_in_executor(None, next_chunk),
+                    self._is_retryable
+                )
+        except BaseException:
+            file_content.close()
+            raise
+
+        file_content.seek(0)
+        return file_content
+
+    async def _process_pdf_file(self, file_id: str, size: int = 0, reservation=None) -> str:
+        if size >= self.config['RANGE_READ_MIN_SIZE']:
+            # Large PDF - fetch only the byte ranges PdfReader actually reads
+            file_content = RangeFile(
+                lambda start, end: self._fetch_range(file_id, start, end),
+                size,
+                block_size=self.config['RANGE_BLOCK_SIZE'],
+                max_blocks=self.config['RANGE_CACHE_BLOCKS']
             )
+        else:
+            # Download PDF and extract text
+            file_content = await self._download(file_id)
 
-        # Use PIL and pytesseract for OCR
-        with Image.open(file_content) as img:
+        with file_content:
             content = await asyncio.get_event_loop().run_in_executor(
                 None,
-                lambda: pytesseract.image_to_string(img)
+                self._extract_pdf_text,
+                file_content
             )
+            if not content.strip() and self.ocr is not None:
+                # Scanned PDF without a text layer - OCR the rendered pages instead. OCR reserves
+                # memory page by page, so holding the caller's reservation too could starve it
+                if reservation is not None:
+                    await reservation.release()
+                content = await self.ocr.pdf_to_text(
+                    file_content, self.config['MAX_CONTENT_LENGTH'], self.memory_budget)
+            if isinstance(file_content, RangeFile):
+                print(f"Read {file_content.bytes_fetched / 1024 / 1024:.1f}MB of {size / 1024 / 1024:.1f}MB PDF "
+                      f"{file_id} in {file_content.requests} range requests")
+            return content
+
+    def _extract_pdf_text(self, pdf_file) -> str:
+        """Extract text with PyPDF2 - blocking, meant to be run in executor"""
+        reader = lazy_import('PyPDF2').PdfReader(pdf_file)
+        content_parts = []
+        total = 0
+
+        # Walk the page tree lazily so a range-read PDF only fetches the pages read here
+        for page in pdf_pages(reader):
+            content_parts.append(page.extract_text())
+            total += len(content_parts[-1])
+            if total >= self.config['MAX_CONTENT_LENGTH']:
+                break  # The rest would be truncated anyway, so its pages are never read
+
+        return "\n".join(content_parts)
+
+    def _fetch_range(self, file_id: str, start: int, end: int) -> bytes:
+        """Fetch bytes start..end of a file - blocking, called by RangeFile reads in the executor.
+
+        Runs outside the event loop, so it retries on its own but follows the same
+        policy as Backend.call: the Drive circuit breaker and the shared retry budget.
+        """
+        backend = self.backend
+        backend.retry_budget.deposit()
+        for attempt in range(backend.config['MAX_ATTEMPTS']):
+            if not backend.breaker.allow():
+                raise CircuitOpenError(f"{backend.name} is temporarily unavailable after repeated failures")
+            request = self.service.files().get_media(fileId=file_id)
+            request.headers['Range'] = f'bytes={start}-{end}'
+            try:
+                data = request.execute(http=self._http())
+                backend.breaker.record_success()
+                return data
+            except Exception as e:
+                if not self._is_retryable(e):
+                    # The backend answered, it just refused this request
+                    backend.breaker.record_success()
+                    raise
+                backend.breaker.record_failure()
+                if attempt == backend.config['MAX_ATTEMPTS'] - 1 or not backend.retry_budget.try_spend():
+                    raise
+                backend.retries += 1
+                ceiling = min(backend.config['MAX_DELAY'], backend.config['BASE_DELAY'] * 2 ** attempt)
+                time.sleep(random.uniform(0, ceiling))
+
+    async def _process_image_file(self, file_id: str) -> str:
+        if self.ocr is None:
+            return "[Image file - text extraction is disabled on this bot]"
+
+        # Handle images using OCR
+        with await self._download(file_id) as file_content:
+            # Use PIL and the OCR service
+            with lazy_import('PIL.Image').open(file_content) as img:
+                content = await asyncio.get_event_loop().run_in_executor(
+                    None,
+                    lambda: self.ocr.image_to_text(img)
+                )
 
         if not content.strip():
             return "[Image file - no text detected]"
@@ -355,16 +748,5 @@ class DriveProcessor:
 
     async def _process_text_file(self, file_id: str) -> str:
         # Handle plain text files
-        request = self.service.files().get_media(fileId=file_id)
-        file_content = io.BytesIO()
-        downloader = MediaIoBaseDownload(file_content, request)
-
-        # Download in chunks
-        done = False
-        while not done:
-            _, done = await asyncio.get_event_loop().run_in_executor(
-                None,
-                downloader.next_chunk
-            )
-
-        return file_content.getvalue().decode('utf-8')
+        with await self._download(file_id) as file_content:
+            return file_content.read().decode('utf-8')
@@ -1,23 +1,84 @@
 import aiohttp
 import io
-import os
-import tempfile
-from PIL import Image
-from PyPDF2 import PdfReader
-import pytesseract
 import asyncio
+from collections import OrderedDict
 from async_timeout import timeout
+from .memory_budget import MemoryBudget
+from .native_attachments import NativeAttachments
+from .ocr import OcrService
+from .startup import lazy_import
 
 
 class FileProcessor:
-    def __init__(self):
+    SCANNED_PDF = "[This appears to be a scanned PDF - no extractable text found]"
+    # Failures worth retrying later rather than remembering
+    TRANSIENT_ERRORS = ("[Timeout downloading", "[Network error", "[Could not access", "[Error processing file",
+                        "[Server busy")
+
+    def __init__(self, ocr: OcrService = None, memory_budget: MemoryBudget = None,
+                 native: NativeAttachments = None):
+        # OCR is optional - without it images are reported rather than read
+        self.ocr = ocr
+        # Set in native attachment mode: PDFs and images go to Claude as-is instead of being extracted
+        self.native = native
+        # Shared with DriveProcessor so both draw on one process-wide budget
+        self.memory_budget = memory_budget or MemoryBudget()
         self.config = {
             'MAX_FILE_SIZE': 10 * 1024 * 1024,  # 10MB
             'DOWNLOAD_TIMEOUT': 30,  # seconds
-            'MAX_IMAGE_PIXELS': 40000000  # 40MP
+            'MAX_IMAGE_PIXELS': 40000000,  # 40MP
+            'CHUNK_SIZE': 64 * 1024,
+            'MAX_CONTENT_LENGTH': 100000,
+            'RESULT_CACHE_ENTRIES': 500,
+            'RESULT_CACHE_CHARS': 5000000
         }
 
+        # Extracted text by attachment id, so history reads and prefetching share the work
+        self._results = OrderedDict()
+        self._result_chars = 0
+        self._inflight = {}  # attachment id -> extraction task
+        self.cache_hits = 0
+        self.cache_misses = 0
+
     async def get_file_content(self, attachment) -> str:
+        """Read an attachment, reusing a finished or in-flight extraction of the same attachment"""
+        key = attachment.id
+        if key in self._results:
+            self._results.move_to_end(key)
+            self.cache_hits += 1
+            return self._results[key]
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.cache_misses += 1
+            task = asyncio.ensure_future(self._read_file_content(attachment))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._store_result(key, done))
+        else:
+            self.cache_hits += 1
+        # A caller that times out must not cancel the extraction others are waiting on
+        return await asyncio.shield(task)
+
+    def _store_result(self, key, task):
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        content = task.result()
+        if not content or content.startswith(self.TRANSIENT_ERRORS):
+            return
+
+        self._results[key] = content
+        self._result_chars += len(content)
+        while (len(self._results) > self.config['RESULT_CACHE_ENTRIES']
+               or self._result_chars > self.config['RESULT_CACHE_CHARS']):
+            _, evicted = self._results.popitem(last=False)
+            self._result_chars -= len(evicted)
+
+    def describe(self) -> str:
+        return (f"Attachment results: {len(self._results)} cached, {len(self._inflight)} in flight, "
+                f"{self.cache_hits} hits / {self.cache_misses} misses")
+
+    async def _read_file_content(self, attachment) -> str:
         """Download and read file content from attachment with support for PDFs and images"""
         # Check file extension against whitelist first
         ext = attachment.filename.lower().split('.')[-1]
@@ -29,49 +90,114 @@ class FileProcessor:
         if not content_type or not any(content_type.startswith(t) for t in ['image/', 'application/pdf', 'text/']):
             return f"[Unsupported content type: {content_type}]"
 
+        try:
+            # Reserve the estimated peak memory before downloading anything
+            async with self.memory_budget.reserve(self._estimate_cost(attachment)) as reservation:
+                with self.memory_budget.spooled_file() as spool:
+                    error = await self._download(attachment, spool)
+                    if error:
+                        return error
+
+                    # Process based on file type
+                    if attachment.filename.lower().endswith('.pdf'):
+                        # Use run_in_executor for CPU-intensive PDF processing
+                        content = await asyncio.get_event_loop().run_in_executor(
+                            None,
+                            self._process_pdf_sync,
+                            spool
+                        )
+                        if content == self.SCANNED_PDF and self.ocr is not None:
+                            # No text layer - fall back to OCR of the rendered pages, which reserves
+                            # memory page by page; holding this reservation too could starve it
+                            await reservation.release()
+                            content = await self.ocr.pdf_to_text(
+                                spool, self.config['MAX_CONTENT_LENGTH'], self.memory_budget)
+                        return content
+                    elif any(attachment.filename.lower().endswith(ext) for ext in ['.png', '.jpg', '.jpeg', '.gif', '.bmp']):
+                        return await self._analyze_image_file(spool)
+                    else:
+                        # Handle as text file
+                        try:
+                            return spool.read().decode('utf-8')
+                        except UnicodeDecodeError:
+                            return "[Invalid text file encoding]"
+
+        except asyncio.TimeoutError:
+            return f"[Timeout downloading: {attachment.filename}]"
+        except aiohttp.ClientError as e:
+            return f"[Network error accessing file: {str(e)}]"
+        except Exception as e:
+            return f"[Error processing file: {str(e)}]"
+
+    async def get_native_block(self, attachment) -> tuple:
+        """(content block, prompt note) to send a PDF or image attachment to Claude directly.
+
+        Returns (None, None) when native mode is off or the file does not fit, so the
+        caller falls back to get_file_content.
+        """
+        content_type = attachment.content_type or ''
+        if self.native is None or not (content_type == 'application/pdf' or content_type.startswith('image/')):
+            return None, None
+        if attachment.size and attachment.size > self.config['MAX_FILE_SIZE']:
+            return None, None
+
+        try:
+            async with self.memory_budget.reserve((attachment.size or self.config['MAX_FILE_SIZE']) * 3):
+                with self.memory_budget.spooled_file() as spool:
+                    if await self._download(attachment, spool):
+                        return None, None
+                    return await asyncio.get_event_loop().run_in_executor(
+                        None,
+                        self.native.block_for,
+                        content_type,
+                        spool,
+                        attachment.filename
+                    )
+        except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+            print(f"Could not download {attachment.filename} for native passthrough: {e}")
+            return None, None
+
+    async def _download(self, attachment, spool):
+        """Stream an attachment into spool and rewind it; returns an error message, or None on success"""
         async with aiohttp.ClientSession() as session:
-            try:
-                # Add timeout for download
-                async with timeout(self.config['DOWNLOAD_TIMEOUT']):
-                    async with session.get(attachment.url) as response:
-                        if response.status != 200:
-                            return f"[Could not access file: {attachment.filename}]"
-
-                        # Check size before downloading complete file
-                        content_length = int(
-                            response.headers.get('Content-Length', 0))
-                        if content_length > self.config['MAX_FILE_SIZE']:
+            # Add timeout for download
+            async with timeout(self.config['DOWNLOAD_TIMEOUT']):
+                async with session.get(attachment.url) as response:
+                    if response.status != 200:
+                        return f"[Could not access file: {attachment.filename}]"
+
+                    # Check size before downloading complete file
+                    content_length = int(
+                        response.headers.get('Content-Length', 0))
+                    if content_length > self.config['MAX_FILE_SIZE']:
+                        return f"[File too large: {attachment.filename}]"
+
+                    # Stream to a spooled file so large payloads never sit in memory whole
+                    received = 0
+                    async for chunk in response.content.iter_chunked(self.config['CHUNK_SIZE']):
+                        received += len(chunk)
+                        if received > self.config['MAX_FILE_SIZE']:
                             return f"[File too large: {attachment.filename}]"
-
-                        file_bytes = await response.read()
-
-                        # Process based on file type
-                        if attachment.filename.lower().endswith('.pdf'):
-                            # Use run_in_executor for CPU-intensive PDF processing
-                            content = await asyncio.get_event_loop().run_in_executor(
-                                None,
-                                self._process_pdf_sync,
-                                file_bytes
-                            )
-                            return content
-                        elif any(attachment.filename.lower().endswith(ext) for ext in ['.png', '.jpg', '.jpeg', '.gif', '.bmp']):
-                            return await self.analyze_image(file_bytes)
-                        else:
-                            # Handle as text file
-                            try:
-                                return file_bytes.decode('utf-8')
-                            except UnicodeDecodeError:
-                                return "[Invalid text file encoding]"
-
-            except asyncio.TimeoutError:
-                return f"[Timeout downloading: {attachment.filename}]"
-            except aiohttp.ClientError as e:
-                return f"[Network error accessing file: {str(e)}]"
-            except Exception as e:
-                return f"[Error processing file: {str(e)}]"
+                        spool.write(chunk)
+                    spool.seek(0)
+        return None
+
+    def _estimate_cost(self, attachment) -> int:
+        """Rough peak bytes held while an attachment is downloaded and decoded"""
+        size = attachment.size or self.config['MAX_FILE_SIZE']
+        name = attachment.filename.lower()
+        if name.endswith('.pdf'):
+            return size * 3  # Raw bytes, parsed objects and extracted text
+        if attachment.content_type and attachment.content_type.startswith('image/'):
+            width, height = getattr(attachment, 'width', None), getattr(attachment, 'height', None)
+            if width and height:
+                return size + width * height * 4  # Decoded RGBA pixels
+            return size + self.config['MAX_IMAGE_PIXELS'] * 4
+        return size * 3  # Raw bytes plus the decoded string
 
     async def _is_valid_image(self, image_bytes: bytes) -> bool:
         """Quick check if bytes represent a valid image"""
+        Image = lazy_import('PIL.Image')
         try:
             with io.BytesIO(image_bytes) as img_stream:
                 with Image.open(img_stream) as img:
@@ -82,70 +208,49 @@ class FileProcessor:
             return False
 
     async def extract_pdf_content(self, pdf_bytes):
-        """Extract text content from PDF bytes with better error handling"""
-        try:
-            # Create a temporary file to save PDF content
-            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_pdf:
-                temp_pdf.write(pdf_bytes)
-                temp_pdf.seek(0)
-                temp_path = temp_pdf.name
-
-            try:
-                # Read PDF content with explicit error handling
-                reader = PdfReader(temp_path)
-                text_content = []
-
-                if len(reader.pages) == 0:
-                    return "[PDF file appears to be empty]"
-
-                # Extract text from each page with page numbers
-                for i, page in enumerate(reader.pages, 1):
-                    page_text = page.extract_text()
-                    if page_text.strip():  # Only add non-empty pages
-                        text_content.append(
-                            f"--- Page {i} ---\n{page_text.strip()}")
-
-                # Clean up temporary file
-                os.unlink(temp_path)
-
-                if not text_content:
-                    return "[PDF file contains no extractable text - it may be scanned or image-based]"
-
-                full_text = "\n\n".join(text_content)
-                if len(full_text) > 100000:
-                    return full_text[:100000] + "\n[Content truncated due to length]"
-                return full_text
-
-            except Exception as e:
-                # Clean up temp file if PDF processing fails
-                os.unlink(temp_path)
-                raise
-
-        except Exception as e:
-            return f"[Error extracting PDF content: {str(e)}]"
+        """Extract text content from PDF bytes without blocking the event loop"""
+        with io.BytesIO(pdf_bytes) as pdf_file:
+            return await asyncio.get_event_loop().run_in_executor(
+                None,
+                self._process_pdf_sync,
+                pdf_file
+            )
 
     async def analyze_image(self, image_bytes: bytes) -> str:
         """Analyze image content using OCR and basic properties"""
         if len(image_bytes) > self.config['MAX_FILE_SIZE']:
             return "[Image too large for analysis]"
 
+        with io.BytesIO(image_bytes) as img_stream:
+            return await self._analyze_image_file(img_stream, reserve=True)
+
+    async def _analyze_image_file(self, img_file, reserve: bool = False) -> str:
+        """OCR an image file object; reserve=True charges the decode to the memory budget here"""
+        if self.ocr is None:
+            return "[Image text extraction is disabled on this bot]"
+
+        Image = lazy_import('PIL.Image')
         try:
-            with Image.open(io.BytesIO(image_bytes)) as img:
+            # Opening only reads the header, so dimensions are known before decoding
+            with Image.open(img_file) as img:
                 width, height = img.size
                 if width * height > self.config['MAX_IMAGE_PIXELS']:
                     return "[Image dimensions too large for processing]"
 
-                # Run OCR in threadpool
-                text = await asyncio.get_event_loop().run_in_executor(
-                    None,
-                    lambda: pytesseract.image_to_string(img)
-                )
+                async with self.memory_budget.reserve(width * height * 4 if reserve else 0):
+                    # Run OCR in threadpool
+                    text = await asyncio.get_event_loop().run_in_executor(
+                        None,
+                        lambda: self.ocr.image_to_text(img)
+                    )
 
                 if not text.strip():
                     return "[No text detected in image]"
 
                 return text.strip()
 
+        except asyncio.TimeoutError:
+            return "[Server busy - try the image again shortly]"
         except Exception as e:
             return f"[Error analyzing image: {str(e)}]"
 
@@ -158,48 +263,34 @@ class FileProcessor:
         except UnicodeDecodeError:
             return f"[Binary file: {filename}]"
 
-    def _process_pdf_sync(self, pdf_bytes: bytes) -> str:
-        """Synchronously process PDF content - meant to be run in executor"""
+    def _process_pdf_sync(self, pdf_file) -> str:
+        """Synchronously process PDF content from a binary file object - meant to be run in executor"""
         try:
-            # Create a temporary file to save PDF content
-            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_pdf:
-                temp_pdf.write(pdf_bytes)
-                temp_pdf.seek(0)
-                temp_path = temp_pdf.name
-
-            try:
-                # Read PDF content
-                reader = PdfReader(temp_pdf.name)
-                text_content = []
-
-                if len(reader.pages) == 0:
-                    return "[PDF file appears to be empty]"
-
-                # Extract text from each page
-                for i, page in enumerate(reader.pages, 1):
-                    page_text = page.extract_text()
-                    if page_text and page_text.strip():
-                        text_content.append(f"[Page {i}]\n{page_text.strip()}")
-
-                if not text_content:
-                    # If no text was extracted, PDF might be scanned
-                    return "[This appears to be a scanned PDF - no extractable text found]"
-
-                # Join all pages with clear separation
-                full_text = "\n\n".join(text_content)
-
-                # Truncate if too long
-                if len(full_text) > 100000:
-                    return full_text[:100000] + "\n[Content truncated due to length]"
-
-                return full_text
-
-            finally:
-                # Clean up temp file
-                try:
-                    os.unlink(temp_path)
-                except:
-                    pass
+            # Read PDF content straight from the (possibly spooled) file
+            reader = lazy_import('PyPDF2').PdfReader(pdf_file)
+            text_content = []
+
+            if len(reader.pages) == 0:
+                return "[PDF file appears to be empty]"
+
+            # Extract text from each page
+            for i, page in enumerate(reader.pages, 1):
+                page_text = page.extract_text()
+                if page_text and page_text.strip():
+                    text_content.append(f"[Page {i}]\n{page_text.strip()}")
+
+            if not text_content:
+                # If no text was extracted, PDF might be scanned
+                return self.SCANNED_PDF
+
+            # Join all pages with clear separation
+            full_text = "\n\n".join(text_content)
+
+            # Truncate if too long
+            if len(full_text) > 100000:
+                return full_text[:100000] + "\n[Content truncated due to length]"
+
+            return full_text
 
         except Exception as e:
             return f"[Error reading PDF: {str(e)}]"
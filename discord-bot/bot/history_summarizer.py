@@ -0,0 +1,108 @@
+import asyncio
+import sqlite3
+import time
+from datetime import datetime
+import discord
+from .claude_client import ClaudeClient
+from .startup import resolve_data_dir
+
+
+class HistorySummarizer:
+    """Per-channel rolling summary of the messages that have scrolled out of the raw history window.
+
+    Older messages are folded into a stored summary in the background, and only once
+    enough new text has built up, so prompts carry a compact summary plus a short raw tail.
+    """
+
+    def __init__(self, claude_client: ClaudeClient, data_dir: str = None):
+        self.claude_client = claude_client
+        self.config = {
+            'FOLD_THRESHOLD_CHARS': 6000,  # New text needed before the summary is refreshed
+            'SUMMARY_MAX_CHARS': 3000,
+            'FOLD_SCAN_LIMIT': 200,  # Messages read per fold
+            'FOLD_COOLDOWN': 120  # seconds between checks of the same channel
+        }
+
+        self.data_dir = resolve_data_dir(data_dir)
+        self.data_dir.mkdir(exist_ok=True)
+
+        self._db = sqlite3.connect(self.data_dir / 'history.db')
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS channel_summaries (
+                channel_id INTEGER PRIMARY KEY,
+                summary TEXT NOT NULL,
+                last_message_id INTEGER NOT NULL,
+                updated_at TEXT NOT NULL
+            )""")
+        self._db.commit()
+
+        self._tasks = {}  # channel id -> running fold
+        self._last_checked = {}  # channel id -> monotonic time of the last fold check
+
+    def get_summary(self, channel_id: int) -> str:
+        row = self._db.execute(
+            "SELECT summary FROM channel_summaries WHERE channel_id = ?", (channel_id,)).fetchone()
+        return row[0] if row else ""
+
+    def schedule_fold(self, channel, before: discord.Message):
+        """Fold messages older than `before` into the summary in the background"""
+        task = self._tasks.get(channel.id)
+        if task is not None and not task.done():
+            return
+        now = time.monotonic()
+        if now - self._last_checked.get(channel.id, 0) < self.config['FOLD_COOLDOWN']:
+            return
+        self._last_checked[channel.id] = now
+        self._tasks[channel.id] = asyncio.create_task(self._fold(channel, before))
+
+    async def _fold(self, channel, before: discord.Message):
+        try:
+            row = self._db.execute(
+                "SELECT summary, last_message_id FROM channel_summaries WHERE channel_id = ?",
+                (channel.id,)).fetchone()
+            summary, last_id = row if row else ("", None)
+
+            if last_id is None:
+                # First fold: start from the most recent messages rather than the channel's beginning
+                messages = [m async for m in channel.history(
+                    limit=self.config['FOLD_SCAN_LIMIT'], before=before)]
+                messages.reverse()
+            else:
+                messages = [m async for m in channel.history(
+                    limit=self.config['FOLD_SCAN_LIMIT'], before=before,
+                    after=discord.Object(id=last_id), oldest_first=True)]
+
+            lines = [self._format_line(m) for m in messages if not m.author.bot]
+            # A full page is folded regardless, otherwise the same short window would be rescanned forever
+            full_page = len(messages) == self.config['FOLD_SCAN_LIMIT']
+            if sum(len(line) for line in lines) < self.config['FOLD_THRESHOLD_CHARS'] and not full_page:
+                return  # Not enough new content to be worth a refresh yet
+
+            if lines:
+                new_summary = await self.claude_client.summarize(
+                    summary, "\n".join(lines), self.config['SUMMARY_MAX_CHARS'])
+                if not new_summary:
+                    return
+            else:
+                new_summary = summary  # Only bot messages - nothing to add, just move past them
+
+            self._db.execute(
+                "INSERT OR REPLACE INTO channel_summaries VALUES (?, ?, ?, ?)",
+                (channel.id, new_summary.strip()[:self.config['SUMMARY_MAX_CHARS']],
+                 messages[-1].id, datetime.utcnow().isoformat()))
+            self._db.commit()
+
+        except Exception as e:
+            print(f"Error summarizing history for channel {channel.id}: {e}")
+
+    def _format_line(self, message) -> str:
+        # Attachments are named, not extracted - the summary only needs to know they were shared
+        line = f"[{message.created_at.isoformat()}] {message.author.name}: {message.content}"
+        if message.attachments:
+            line += " [attached: " + ", ".join(a.filename for a in message.attachments) + "]"
+        return line
+
+    def close(self):
+        for task in self._tasks.values():
+            task.cancel()
+        self._db.close()
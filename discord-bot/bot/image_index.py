@@ -0,0 +1,216 @@
+import itertools
+import math
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from .startup import lazy_import
+
+
+def dhash(img, hash_size: int = 16) -> int:
+    """Difference hash: one bit per adjacent pixel pair of a small grayscale thumbnail.
+
+    Re-encoding and tiny crops flip only a few bits, so near-duplicate images land
+    within a small Hamming distance of each other. It says nothing about the text: on
+    a mostly blank screenshot most bits are zero, so different screenshots with the
+    same layout hash alike. Treat a match as a candidate, never as proof.
+    """
+    thumb = img.convert('L').resize((hash_size + 1, hash_size))
+    pixels = list(thumb.getdata())
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+
+def _profile_shift(stored, new, max_shift: int) -> int:
+    """Offset of new inside stored that best lines up two 1-pixel-thick profile images.
+
+    Returns where new's first pixel falls in stored's coordinates, searched within
+    +-max_shift; negative when stored is the cropped one.
+    """
+    ImageChops = lazy_import('PIL.ImageChops')
+    ImageStat = lazy_import('PIL.ImageStat')
+    horizontal = stored.height == 1
+    stored_length = stored.width if horizontal else stored.height
+    new_length = new.width if horizontal else new.height
+
+    def span(image, start, stop):
+        return image.crop((start, 0, stop, 1) if horizontal else (0, start, 1, stop))
+
+    best_shift, best_error = 0, None
+    for shift in range(-max_shift, max_shift + 1):
+        start, stop = max(shift, 0), min(stored_length, shift + new_length)
+        if stop - start < min(stored_length, new_length) // 2:
+            continue
+        error = ImageStat.Stat(ImageChops.difference(
+            span(stored, start, stop), span(new, start - shift, stop - shift))).mean[0]
+        if best_error is None or error < best_error:
+            best_shift, best_error = shift, error
+    return best_shift
+
+
+class ImageSignature:
+    """What the index keeps of an image: its dHash to find candidates, plus row and column
+    profiles and a thumbnail of tile means to confirm that a candidate shows the same text"""
+
+    MAX_THUMBNAIL_PIXELS = 160000
+
+    def __init__(self, img):
+        Image = lazy_import('PIL.Image')
+        self.gray = img.convert('L')  # Only needed until the signature is stored
+        self.hash = dhash(self.gray)
+        self.size = self.gray.size
+        # 4px tiles keep a one-digit edit in screen-sized text well above re-encoding noise;
+        # bigger images get bigger tiles so the thumbnail stays bounded
+        self.tile = max(4, math.ceil(math.sqrt(self.size[0] * self.size[1] / self.MAX_THUMBNAIL_PIXELS)))
+        self.columns = self.gray.resize((self.size[0], 1), Image.Resampling.BOX)
+        self.rows = self.gray.resize((1, self.size[1]), Image.Resampling.BOX)
+        self.tiles = None  # zlib-compressed thumbnail of tile means, once stored
+        self.tiles_size = None
+
+    def freeze(self):
+        """Drop the full image and keep a compressed tile thumbnail - called once the signature is stored"""
+        if self.tiles is None:
+            thumbnail = self.gray.reduce(self.tile)
+            self.tiles, self.tiles_size = zlib.compress(thumbnail.tobytes()), thumbnail.size
+            self.gray = None
+        return self
+
+    def thumbnail(self):
+        return lazy_import('PIL.Image').frombytes('L', self.tiles_size, zlib.decompress(self.tiles))
+
+    def nbytes(self) -> int:
+        return len(self.tiles or b"") + self.size[0] + self.size[1]
+
+
+class BKTree:
+    """Burkhard-Keller tree over integer hashes with Hamming distance as the metric"""
+
+    def __init__(self):
+        self.root = None  # [hash, [values], {distance: child}]
+        self.size = 0
+
+    def add(self, key: int, value):
+        self.size += 1
+        if self.root is None:
+            self.root = [key, [value], {}]
+            return
+        node = self.root
+        while True:
+            distance = (key ^ node[0]).bit_count()
+            if distance == 0:
+                node[1].append(value)  # Different images can share a hash
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [key, [value], {}]
+                return
+            node = child
+
+    def within(self, key: int, max_distance: int) -> list:
+        """(distance, value) of every entry within max_distance, closest and then newest first"""
+        found = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            distance = (key ^ node[0]).bit_count()
+            if distance <= max_distance:
+                found.extend((distance, value) for value in reversed(node[1]))
+            # Triangle inequality: only children within the search radius can match
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        found.sort(key=lambda match: match[0])
+        return found
+
+
+class ImageTextIndex:
+    """Perceptual-hash index of OCR results so reposted screenshots skip Tesseract.
+
+    The hash only finds candidates. A candidate's text is reused only after the new
+    image is lined up against it by its row and column profiles and every tile of the
+    overlap matches, so re-encodes and slight crops hit while an edited number misses.
+    """
+
+    def __init__(self, max_distance: int = 4, max_entries: int = 1000):
+        self.config = {
+            'MAX_DISTANCE': max_distance,  # Hamming bits out of 256
+            'MAX_CROP': 0.05,  # Share of each side that may be cropped off and still match
+            'MAX_TILE_DIFF': 20,  # Gray levels a tile mean may drift, e.g. from JPEG re-encoding
+            'MAX_CANDIDATES': 16,  # Confirmations tried per lookup
+            'MAX_ENTRIES': max_entries
+        }
+        self._entries = OrderedDict()  # entry id -> (signature, text), oldest first
+        self._ids = itertools.count()
+        self._tree = BKTree()
+        self._lock = threading.Lock()  # Lookups run in executor threads
+        self.hits = 0
+        self.misses = 0
+        self._lookup_seconds = 0.0
+
+    def lookup(self, img):
+        """Return (signature, stored text or None) for a PIL image"""
+        started = time.perf_counter()
+        signature = ImageSignature(img)
+        with self._lock:
+            candidates = self._tree.within(signature.hash, self.config['MAX_DISTANCE'])
+        text = None
+        for _, (stored, stored_text) in candidates[:self.config['MAX_CANDIDATES']]:
+            if self._same_content(stored, signature):
+                text = stored_text
+                break
+        with self._lock:
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            self._lookup_seconds += time.perf_counter() - started
+        return signature, text
+
+    def _same_content(self, stored: ImageSignature, new: ImageSignature) -> bool:
+        """Whether new is stored, possibly re-encoded or slightly cropped, tile for tile"""
+        ImageChops = lazy_import('PIL.ImageChops')
+        (stored_width, stored_height), (width, height) = stored.size, new.size
+        max_crop = self.config['MAX_CROP']
+        for a, b in ((stored_width, width), (stored_height, height)):
+            if min(a, b) < max(a, b) * (1 - max_crop):
+                return False
+
+        # Where new's top-left corner falls in stored's coordinates
+        dx = _profile_shift(stored.columns, new.columns, math.ceil(max(stored_width, width) * max_crop))
+        dy = _profile_shift(stored.rows, new.rows, math.ceil(max(stored_height, height) * max_crop))
+
+        # Compare the stored tiles that lie wholly inside the overlap
+        tile = stored.tile
+        left, top = -(-max(dx, 0) // tile), -(-max(dy, 0) // tile)
+        right, bottom = min(stored_width, dx + width) // tile, min(stored_height, dy + height) // tile
+        if right <= left or bottom <= top:
+            return False
+        aligned = new.gray.crop(
+            (left * tile - dx, top * tile - dy, right * tile - dx, bottom * tile - dy)).reduce(tile)
+        expected = stored.thumbnail().crop((left, top, right, bottom))
+        return ImageChops.difference(aligned, expected).getextrema()[1] <= self.config['MAX_TILE_DIFF']
+
+    def add(self, signature: ImageSignature, text: str):
+        with self._lock:
+            value = (signature.freeze(), text)
+            self._entries[next(self._ids)] = value
+            self._tree.add(signature.hash, value)
+            if len(self._entries) > self.config['MAX_ENTRIES']:
+                # BK-trees cannot delete, so rebuild from the newer half
+                while len(self._entries) > self.config['MAX_ENTRIES'] // 2:
+                    self._entries.popitem(last=False)
+                self._tree = BKTree()
+                for entry_signature, entry_text in self._entries.values():
+                    self._tree.add(entry_signature.hash, (entry_signature, entry_text))
+
+    def describe(self) -> str:
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups * 100 if lookups else 0.0
+        mean_us = self._lookup_seconds / lookups * 1e6 if lookups else 0.0
+        kept = sum(signature.nbytes() for signature, _ in self._entries.values())
+        return (f"Image OCR index: {len(self._entries)} images ({kept / 1024 / 1024:.1f}MB), "
+                f"{self.hits}/{lookups} hits ({hit_rate:.0f}%), {mean_us:.0f}us per lookup")
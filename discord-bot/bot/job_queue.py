@@ -0,0 +1,195 @@
+import asyncio
+import json
+import sqlite3
+import time
+from datetime import datetime
+from .startup import resolve_data_dir
+
+
+class JobQueue:
+    """Durable SQLite-backed queue for heavy commands, processed by a small worker pool.
+
+    Jobs survive restarts: anything still queued or running when the process stops
+    is picked up again on the next start.
+    """
+
+    def __init__(self, data_dir: str = None, max_workers: int = 2):
+        self.config = {
+            'MAX_WORKERS': max_workers,
+            'MAX_PENDING_PER_USER': 3,
+            'PROGRESS_INTERVAL': 15,  # seconds between progress posts for one job
+            'IDLE_POLL': 30  # seconds
+        }
+
+        self.data_dir = resolve_data_dir(data_dir)
+        self.data_dir.mkdir(exist_ok=True)
+
+        self._db = sqlite3.connect(self.data_dir / 'jobs.db')
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                user_name TEXT NOT NULL,
+                channel_id INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                progress TEXT,
+                error TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )""")
+        self._db.commit()
+
+        self._handlers = {}  # kind -> async handler(job, progress) returning the answer
+        self._running = {}  # job id -> task
+        self._workers = []
+        self._wakeup = asyncio.Event()
+        self._post = None
+        self._stopping = False
+
+    def register(self, kind: str, handler):
+        self._handlers[kind] = handler
+
+    async def start(self, post):
+        """Requeue interrupted jobs and start the workers; post(channel_id, text, prefix="") delivers messages"""
+        self._post = post
+        self._update_where("status = 'running'", status='queued', progress='Resumed after restart')
+        for _ in range(self.config['MAX_WORKERS']):
+            self._workers.append(asyncio.create_task(self._worker()))
+
+    async def stop(self):
+        # Running jobs stay marked as running so the next start resumes them
+        self._stopping = True
+        tasks = self._workers + list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._db.close()
+
+    def enqueue(self, kind: str, user_id: int, user_name: str, channel_id: int, payload: dict) -> int:
+        """Add a job and return its id; raises ValueError if the user already has too many pending"""
+        pending = self._db.execute(
+            "SELECT COUNT(*) FROM jobs WHERE user_id = ? AND status IN ('queued', 'running')",
+            (user_id,)).fetchone()[0]
+        if pending >= self.config['MAX_PENDING_PER_USER']:
+            raise ValueError(
+                f"You already have {pending} jobs pending. Wait for one to finish or cancel it with /cancel_job.")
+
+        now = datetime.utcnow().isoformat()
+        cursor = self._db.execute(
+            "INSERT INTO jobs (kind, user_id, user_name, channel_id, payload, status, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)",
+            (kind, user_id, user_name, channel_id, json.dumps(payload), now, now))
+        self._db.commit()
+        self._wakeup.set()
+        return cursor.lastrowid
+
+    def list_jobs(self, user_id: int, limit: int = 10) -> list:
+        rows = self._db.execute(
+            "SELECT id, kind, status, progress, error, created_at FROM jobs WHERE user_id = ? "
+            "ORDER BY id DESC LIMIT ?", (user_id, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def cancel(self, job_id: int, user_id: int) -> str:
+        row = self._db.execute("SELECT user_id, status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or row['user_id'] != user_id:
+            return f"No job #{job_id} of yours was found."
+        if row['status'] not in ('queued', 'running'):
+            return f"Job #{job_id} is already {row['status']}."
+
+        self._update(job_id, status='cancelled')
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+        return f"Job #{job_id} cancelled."
+
+    def describe(self) -> str:
+        counts = dict(self._db.execute(
+            "SELECT status, COUNT(*) FROM jobs WHERE status IN ('queued', 'running') GROUP BY status").fetchall())
+        return f"Jobs: {counts.get('running', 0)} running, {counts.get('queued', 0)} queued"
+
+    def _claim_next(self):
+        """Atomically move the oldest queued job to running"""
+        row = self._db.execute(
+            "SELECT * FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+        if row is None:
+            return None
+        self._update(row['id'], status='running')
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        return job
+
+    async def _worker(self):
+        while True:
+            job = self._claim_next()
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.config['IDLE_POLL'])
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            task = asyncio.create_task(self._run(job))
+            self._running[job['id']] = task
+            try:
+                await asyncio.wait([task])
+            finally:
+                self._running.pop(job['id'], None)
+
+    async def _run(self, job: dict):
+        job_id = job['id']
+        last_post = 0.0
+
+        async def progress(text: str):
+            nonlocal last_post
+            self._update(job_id, progress=text)
+            # Throttle channel posts; the latest progress is always visible in /jobs
+            if time.monotonic() - last_post >= self.config['PROGRESS_INTERVAL']:
+                last_post = time.monotonic()
+                try:
+                    await self._post(job['channel_id'], f"⏳ Job #{job_id}: {text}")
+                except Exception as e:
+                    print(f"Could not post progress of job #{job_id}: {e}")
+
+        try:
+            handler = self._handlers[job['kind']]
+            answer = await handler(job, progress)
+            self._update(job_id, status='done', progress='Finished')
+        except asyncio.CancelledError:
+            if self._stopping:
+                raise
+            self._update(job_id, status='cancelled')
+            try:
+                await self._post(job['channel_id'], f"Job #{job_id} was cancelled.")
+            except Exception as post_error:
+                print(f"Could not report cancellation of job #{job_id}: {post_error}")
+            return
+        except Exception as e:
+            self._update(job_id, status='failed', error=str(e))
+            print(f"Job #{job_id} failed: {e}")
+            try:
+                await self._post(job['channel_id'], str(e), prefix=f"<@{job['user_id']}> Job #{job_id} failed:")
+            except Exception as post_error:
+                print(f"Could not report failure of job #{job_id}: {post_error}")
+            return
+
+        # The work is done either way; a failed post is recorded without undoing that. The
+        # mention goes in as a prefix so it stays in plain content when the answer is packed into embeds
+        try:
+            await self._post(job['channel_id'], answer, prefix=f"<@{job['user_id']}> Job #{job_id} finished:")
+        except Exception as e:
+            self._update(job_id, error=f"Finished, but the answer could not be posted: {e}")
+            print(f"Could not post the answer of job #{job_id}: {e}")
+
+    def _update(self, job_id: int, **fields):
+        self._update_where("id = ?", (job_id,), **fields)
+
+    def _update_where(self, where: str, params: tuple = (), **fields):
+        fields['updated_at'] = datetime.utcnow().isoformat()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self._db.execute(f"UPDATE jobs SET {assignments} WHERE {where}", (*fields.values(), *params))
+        self._db.commit()
@@ -0,0 +1,128 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from datetime import datetime
+from pathlib import Path
+from .startup import resolve_data_dir
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+class LoopMonitor:
+    """Detect event loop stalls and capture the stack of the code that blocked.
+
+    A coroutine ticks every interval and measures how late it woke up. A watchdog
+    thread notices when ticks stop and snapshots the loop thread's stack while the
+    blocking call is still running, so the culprit is named in the stall record.
+    """
+
+    def __init__(self, interval: float = 0.1, stall_threshold: float = 0.25, data_dir: str = None):
+        self.config = {
+            'INTERVAL': interval,
+            'STALL_THRESHOLD': stall_threshold,  # seconds
+            'STACK_LIMIT': 25  # frames kept per captured stack
+        }
+
+        self.data_dir = resolve_data_dir(data_dir)
+
+        self.stalls = deque(maxlen=50)  # (time, lag seconds, stack text)
+        self.max_lag = 0.0
+        self._heartbeat = time.monotonic()
+        self._captured_stack = None
+        self._loop_thread_id = None
+        self._task = None
+        self._watchdog = None
+        self._running = False
+        self._profiling = False
+
+    async def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.create_task(self._tick())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        self._running = False
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _tick(self):
+        interval = self.config['INTERVAL']
+        while True:
+            expected = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = now - expected
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.config['STALL_THRESHOLD']:
+                stack = self._captured_stack or "(stack not captured)"
+                self._captured_stack = None
+                self.stalls.append((datetime.utcnow(), lag, stack))
+                print(f"Event loop blocked for {lag * 1000:.0f}ms in:\n{stack}")
+
+    def _watch(self):
+        """Watchdog thread: snapshot the loop thread's stack while it is blocked"""
+        while self._running:
+            time.sleep(self.config['INTERVAL'] / 2)
+            overdue = time.monotonic() - self._heartbeat - self.config['INTERVAL']
+            if overdue >= self.config['STALL_THRESHOLD'] and self._captured_stack is None:
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is not None:
+                    self._captured_stack = "".join(
+                        traceback.format_stack(frame, limit=self.config['STACK_LIMIT']))
+
+    def describe(self) -> str:
+        return (f"Event loop: max lag {self.max_lag * 1000:.0f}ms, "
+                f"{len(self.stalls)} stall(s) over {self.config['STALL_THRESHOLD'] * 1000:.0f}ms recorded")
+
+    async def profile(self, seconds: float, sample_interval: float = 0.005) -> Path:
+        """Sample every thread's stack for `seconds` and write a flamegraph collapsed-stack file.
+
+        The output works with flamegraph.pl, speedscope and inferno.
+        """
+        if self._profiling:
+            raise RuntimeError("A profile is already running")
+        self._profiling = True
+        try:
+            counts = await asyncio.get_running_loop().run_in_executor(
+                None, self._sample, seconds, sample_interval)
+        finally:
+            self._profiling = False
+
+        self.data_dir.mkdir(exist_ok=True)
+        path = self.data_dir / f"profile-{datetime.utcnow():%Y%m%d-%H%M%S}.folded"
+        with open(path, 'w') as output:
+            for stack, count in counts.most_common():
+                output.write(f"{stack} {count}\n")
+        return path
+
+    def _sample(self, seconds: float, sample_interval: float) -> Counter:
+        """Blocking sampler, meant to be run in executor"""
+        counts = Counter()
+        own_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                thread_name = "event-loop" if thread_id == self._loop_thread_id else names.get(thread_id, thread_id)
+                counts[";".join([str(thread_name)] + labels[::-1])] += 1
+            time.sleep(sample_interval)
+        return counts
@@ -0,0 +1,89 @@
+import asyncio
+import tempfile
+from contextlib import asynccontextmanager
+
+
+class Reservation:
+    """Bytes held from a MemoryBudget; yielded by MemoryBudget.reserve"""
+
+    def __init__(self, budget, nbytes: int):
+        self.budget = budget
+        self.nbytes = nbytes
+
+    async def release(self):
+        """Hand the bytes back early, before work that makes reservations of its own"""
+        async with self.budget._condition:
+            self.budget.reserved -= self.nbytes
+            self.nbytes = 0
+            self.budget._condition.notify_all()
+
+
+class MemoryBudget:
+    """Process-wide admission control for downloads and decodes.
+
+    Each task reserves an estimate of the bytes it will hold before it starts and
+    waits while the budget is exhausted, so a burst of large uploads queues up
+    instead of running the container out of memory.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, spool_threshold: int = 2 * 1024 * 1024):
+        self.config = {
+            'MAX_BYTES': max_bytes,
+            'SPOOL_THRESHOLD': spool_threshold,  # Payloads above this spill to a temp file
+            'WAIT_TIMEOUT': 60  # seconds
+        }
+        self._condition = asyncio.Condition()
+        self.reserved = 0
+        self.active = 0
+        self.waiting = 0
+        self.peak = 0
+
+    @asynccontextmanager
+    async def reserve(self, nbytes: int):
+        """Hold nbytes of the budget for the duration of the block.
+
+        Requests larger than the whole budget are clamped so they can still run alone.
+        Raises asyncio.TimeoutError if the budget does not free up in time. Yields a
+        Reservation that can be released before the block ends.
+        """
+        nbytes = min(max(int(nbytes), 0), self.config['MAX_BYTES'])
+        async with self._condition:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(
+                    self._condition.wait_for(
+                        lambda: self.reserved + nbytes <= self.config['MAX_BYTES']),
+                    timeout=self.config['WAIT_TIMEOUT']
+                )
+            finally:
+                self.waiting -= 1
+            self.reserved += nbytes
+            self.active += 1
+            self.peak = max(self.peak, self.reserved)
+
+        reservation = Reservation(self, nbytes)
+        try:
+            yield reservation
+        finally:
+            async with self._condition:
+                self.reserved -= reservation.nbytes
+                self.active -= 1
+                self._condition.notify_all()
+
+    def spooled_file(self):
+        """A file object that stays in memory while small and spills to disk when large"""
+        return tempfile.SpooledTemporaryFile(max_size=self.config['SPOOL_THRESHOLD'])
+
+    def metrics(self) -> dict:
+        return {
+            'reserved_bytes': self.reserved,
+            'max_bytes': self.config['MAX_BYTES'],
+            'active_reservations': self.active,
+            'waiting': self.waiting,
+            'peak_bytes': self.peak
+        }
+
+    def describe(self) -> str:
+        mb = 1024 * 1024
+        return (f"Memory budget: {self.reserved / mb:.1f}/{self.config['MAX_BYTES'] / mb:.0f}MB reserved "
+                f"by {self.active} task(s), {self.waiting} waiting, peak {self.peak / mb:.1f}MB")
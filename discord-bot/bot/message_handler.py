@@ -2,17 +2,37 @@ import aiohttp
 import asyncio
 import discord
 from async_timeout import timeout
+from .answer_cache import AnswerCache
 from .claude_client import ClaudeClient
 from .file_processor import FileProcessor
 from .drive_processor import DriveProcessor
+from .history_summarizer import HistorySummarizer
+from .job_queue import JobQueue
+from .response_sender import ResponseSender
 
 
 class MessageHandler:
-    def __init__(self, claude_client: ClaudeClient, file_processor: FileProcessor, drive_processor: DriveProcessor):
+    def __init__(self, claude_client: ClaudeClient, file_processor: FileProcessor, drive_processor: DriveProcessor,
+                 history_summarizer: HistorySummarizer = None, job_queue: JobQueue = None,
+                 answer_cache: AnswerCache = None):
         self.claude_client = claude_client
         self.file_processor = file_processor
         self.drive_processor = drive_processor
+        self.history_summarizer = history_summarizer or HistorySummarizer(claude_client)
+        self.response_sender = ResponseSender()
         self.aiohttp_session = None
+        # Repeat Drive questions about unchanged files are answered without calling Claude
+        self.answer_cache = answer_cache or AnswerCache()
+
+        # Heavy multi-document commands run through the durable job queue
+        self.job_queue = job_queue or JobQueue()
+        self.job_queue.register('ask_folder', self.run_ask_folder_job)
+        self.job_queue.register('ask_about', self.run_ask_about_job)
+        self.config = {
+            'RAW_TAIL_MESSAGES': 15,
+            'RAW_TAIL_MAX_CHARS': 24000,  # Older messages live on in the channel summary
+            'ATTACHMENT_MAX_CHARS': 8000
+        }
 
     def _check_required_permissions(self, channel):
         """Check if bot has required permissions in the channel"""
@@ -26,8 +46,9 @@ class MessageHandler:
             'send_messages': permissions.send_messages
         }
 
-    async def format_message_history(self, channel, limit=25):
-        """Get recent message history formatted for Claude"""
+    async def format_message_history(self, channel, limit=None):
+        """Get the channel summary plus a bounded tail of recent messages formatted for Claude"""
+        limit = limit or self.config['RAW_TAIL_MESSAGES']
         permissions = self._check_required_permissions(channel)
         missing_permissions = [perm for perm,
                                has_perm in permissions.items() if not has_perm]
@@ -38,8 +59,13 @@ class MessageHandler:
         try:
             async with timeout(30):
                 history = []
+                used_chars = 0
+                boundary = None  # Oldest message covered by the raw tail
                 async for message in channel.history(limit=limit):
+                    if used_chars >= self.config['RAW_TAIL_MAX_CHARS']:
+                        break
                     if message.author.bot:
+                        boundary = message
                         continue
 
                     # Build the basic message content
@@ -62,6 +88,10 @@ class MessageHandler:
                                 async with timeout(10):
                                     content = await self.file_processor.get_file_content(attachment)
                                     if content and content.strip():
+                                        content = content.strip()
+                                        if len(content) > self.config['ATTACHMENT_MAX_CHARS']:
+                                            content = content[:self.config['ATTACHMENT_MAX_CHARS']] + \
+                                                "\n[Attachment truncated]"
                                         # Format attachment content in a clear structure
                                         msg_parts.append(
                                             "\n=== Begin Attachment Content ===")
@@ -70,7 +100,7 @@ class MessageHandler:
                                         msg_parts.append(
                                             f"Content type: {attachment.content_type}")
                                         msg_parts.append("Content:")
-                                        msg_parts.append(content.strip())
+                                        msg_parts.append(content)
                                         msg_parts.append(
                                             "=== End Attachment Content ===\n")
                             except asyncio.TimeoutError:
@@ -80,8 +110,17 @@ class MessageHandler:
                                 msg_parts.append(
                                     f"\n[Error processing attachment {attachment.filename}: {str(e)}]")
 
-                    # Join all parts of the message
-                    history.append(" ".join(msg_parts))
+                    # Join all parts of the message and check it against what is left of the budget
+                    entry = " ".join(msg_parts)
+                    remaining = self.config['RAW_TAIL_MAX_CHARS'] - used_chars
+                    if len(entry) > remaining:
+                        if history:
+                            break  # This message and older ones are left to the channel summary
+                        # The newest message alone is over the budget
+                        entry = entry[:remaining] + "\n[Message truncated]"
+                    boundary = message
+                    history.append(entry)
+                    used_chars += len(entry)
 
         except discord.Forbidden:
             return "[Error: Bot doesn't have permission to read message history]"
@@ -93,11 +132,17 @@ class MessageHandler:
         history.reverse()
         formatted_history = "\n".join(history)
 
+        # Everything older than the raw tail is folded into the summary in the background
+        if boundary is not None:
+            self.history_summarizer.schedule_fold(channel, boundary)
+        summary = self.history_summarizer.get_summary(channel.id)
+        summary_section = f"Summary of earlier conversation:\n{summary}\n\nRecent messages:\n" if summary else ""
+
         # Add a clear header to help Claude understand the context
         return f"""This is a Discord chat history with attachments. Each message shows its timestamp, author, and content. 
 Attachments are clearly marked between === Begin Attachment Content === and === End Attachment Content === markers.
 
-{formatted_history}"""
+{summary_section}{formatted_history}"""
 
     async def handle_ask_command(self, interaction: discord.Interaction, question: str, file: discord.Attachment = None):
         try:
@@ -108,9 +153,17 @@ Attachments are clearly marked between === Begin Attachment Content === and ===
 
             # Process file if provided
             file_content = ""
+            attachments = None
 
-            # Handle both pasted images (which become embedded URLs) and file attachments
+            # In native mode PDFs and images go to Claude as content blocks
             if file:
+                block, note = await self.file_processor.get_native_block(file)
+                if block:
+                    attachments = [block]
+                    file_content = note
+
+            # Handle both pasted images (which become embedded URLs) and file attachments
+            if file and not attachments:
                 if file.content_type and file.content_type.startswith('image/'):
                     # Create session if needed
                     if not self.aiohttp_session:
@@ -129,11 +182,16 @@ Attachments are clearly marked between === Begin Attachment Content === and ===
 
             # Combine question with file content if present
             full_question = question
-            if file_content:
+            if attachments:
+                full_question = f"{question}\n\n{file_content}"
+            elif file_content:
                 full_question = f"{question}\n\nAnalyze this attached file: {file_content}"
 
             # Get Claude's response
-            response = await self.claude_client.get_response(interaction.user.name, full_question, history)
+            response = await self.claude_client.get_response(
+                interaction.user.name, full_question, history,
+                command='ask', guild_id=interaction.guild_id, user_question=question,
+                attachments=attachments)
             await self._send_chunked_response(interaction, response)
 
         except Exception as e:
@@ -141,50 +199,46 @@ Attachments are clearly marked between === Begin Attachment Content === and ===
             raise  # Re-raise to see full traceback in logs
 
     async def _send_chunked_response(self, interaction, response: str):
-        # Handle Discord's 2000 character limit
-        if len(response) <= 1900:
-            await interaction.followup.send(response)
-            return
-
-        # Split into chunks of approximately 1900 characters
-        chunks = []
-        current_chunk = []
-        current_length = 0
-
-        # Split on sentences
-        sentences = [s.strip() + '.' for s in response.split('.') if s.strip()]
-
-        for sentence in sentences:
-            if current_length + len(sentence) > 1900:
-                # Send current chunk
-                chunks.append(' '.join(current_chunk))
-                current_chunk = [sentence]
-                current_length = len(sentence)
-            else:
-                current_chunk.append(sentence)
-                current_length += len(sentence) + 1  # +1 for space
+        # Embeds and attachments keep long answers to one or two sends
+        if not response or not response.strip():
+            response = "Sorry, I couldn't get a response from Claude. Please try again."
+        await self.response_sender.send_interaction(interaction, response)
 
-        # Add any remaining content
-        if current_chunk:
-            chunks.append(' '.join(current_chunk))
-
-        # Send all chunks
-        for chunk in chunks:
-            await interaction.followup.send(chunk)
-
-    async def handle_ask_drive_command(self, interaction: discord.Interaction, doc_id: str, question: str):
+    async def handle_ask_drive_command(self, interaction: discord.Interaction, doc_id: str, question: str,
+                                       fresh: bool = False):
         try:
             await interaction.response.defer()
 
-            # Get document content
-            doc_content = await self.drive_processor.get_document_content(doc_id)
+            try:
+                file = await self.drive_processor.get_file_metadata(doc_id)
+                cache_key = self._cache_key('ask_drive', question, [file])
+            except Exception as e:
+                print(f"Could not fingerprint {doc_id} for the answer cache: {e}")
+                cache_key = None
+            if not fresh and await self._send_cached_answer(interaction, cache_key):
+                return
+
+            # In native mode PDFs and images go to Claude as content blocks
+            block, note = await self.drive_processor.get_native_block(doc_id)
+            if block:
+                prompt = f"""{note}\n\nQuestion: {question}"""
+            else:
+                # Get document content
+                doc_content = await self.drive_processor.get_document_content(doc_id)
+                if self.drive_processor.read_failed(doc_content):
+                    cache_key = None  # Never remember an answer about a read that failed
 
-            # Format prompt with document content
-            prompt = f"""Document content: {doc_content}\n\nQuestion: {question}"""
+                # Format prompt with document content
+                prompt = f"""Document content: {doc_content}\n\nQuestion: {question}"""
 
             # Get Claude's response
-            response = await self.claude_client.get_response(interaction.user.name, prompt, "")
+            response = await self.claude_client.get_response(
+                interaction.user.name, prompt, "",
+                command='ask_drive', guild_id=interaction.guild_id, user_question=question,
+                attachments=[block] if block else None)
 
+            if response and cache_key:
+                self.answer_cache.put(cache_key, response)
             await self._send_chunked_response(interaction, response)
         except Exception as e:
             await interaction.followup.send(f"Error: {str(e)}")
@@ -206,7 +260,8 @@ Attachments are clearly marked between === Begin Attachment Content === and ===
         except Exception as e:
             await interaction.followup.send(f"Error: {str(e)}")
 
-    async def handle_ask_folder_command(self, interaction: discord.Interaction, folder_id: str, question: str):
+    async def handle_ask_folder_command(self, interaction: discord.Interaction, folder_id: str, question: str,
+                                        fresh: bool = False):
         try:
             await interaction.response.defer()
 
@@ -238,23 +293,91 @@ Attachments are clearly marked between === Begin Attachment Content === and ===
                 await self._send_chunked_response(interaction, listing)
                 return
 
-            # If there's a more complex question, get content analysis and combine with listing
-            folder_content = await self.drive_processor.get_folder_content(folder_id)
-            prompt = f"""File listing of the folder:
-                {listing}
+            # A folder whose files are all unchanged since the same question was asked
+            cache_key = self._cache_key('ask_folder', question, files, folder_id)
+            if not fresh and await self._send_cached_answer(interaction, cache_key):
+                return
+
+            # Anything more needs every file read, so it runs as a background job
+            await self._enqueue_job(interaction, 'ask_folder', {
+                'folder_id': folder_id,
+                'question': question,
+                'listing': listing,
+                'cache_key': cache_key
+            })
+
+        except Exception as e:
+            await interaction.followup.send(f"Error: {str(e)}")
+
+    async def run_ask_folder_job(self, job: dict, progress) -> str:
+        """Job handler: read every file in the folder and ask Claude about it"""
+        payload = job['payload']
+        folder_content = await self.drive_processor.get_folder_content(payload['folder_id'], progress)
+        prompt = f"""File listing of the folder:
+                {payload['listing']}
 
                 Folder contents:
                 {folder_content}
 
-                Question: {question}
+                Question: {payload['question']}
 
                 Please start your response by showing the file listing above, then answer the question about the contents."""
 
-            response = await self.claude_client.get_response(interaction.user.name, prompt, "")
-            await self._send_chunked_response(interaction, response)
+        await progress("Waiting for Claude's answer")
+        response = await self.claude_client.get_response(
+            job['user_name'], prompt, "", command='ask_folder',
+            guild_id=payload.get('guild_id'), user_question=payload['question'])
+        # Never remember an answer about a read that failed
+        if response and payload.get('cache_key') and not self.drive_processor.read_failed(folder_content):
+            self.answer_cache.put(payload['cache_key'], response)
+        return response or "Sorry, I couldn't get a response from Claude. Please try again."
+
+    def _cache_key(self, command: str, question: str, files: list, extra: str = "") -> str:
+        return self.answer_cache.key(command, question, self.answer_cache.fingerprint(files, extra))
+
+    async def _send_cached_answer(self, interaction: discord.Interaction, cache_key: str) -> bool:
+        """Send the cached answer for cache_key if there is one; returns whether it was sent"""
+        if cache_key is None:
+            return False
+        answer, age = self.answer_cache.get(cache_key)
+        if answer is None:
+            return False
+        await self._send_chunked_response(
+            interaction,
+            f"{answer}\n\n-# Cached answer from {int(age // 60)} min ago - add `fresh: True` to ask again.")
+        return True
+
+    async def _enqueue_job(self, interaction: discord.Interaction, kind: str, payload: dict):
+        payload['guild_id'] = interaction.guild_id
+        try:
+            job_id = self.job_queue.enqueue(
+                kind, interaction.user.id, interaction.user.name, interaction.channel_id, payload)
+        except ValueError as e:
+            await interaction.followup.send(str(e))
+            return
+        await interaction.followup.send(
+            f"Queued as job #{job_id}. I'll post progress and the answer in this channel. "
+            f"Use `/jobs` to check on it or `/cancel_job {job_id}` to cancel.")
+
+    async def handle_jobs_command(self, interaction: discord.Interaction):
+        jobs = self.job_queue.list_jobs(interaction.user.id)
+        if not jobs:
+            await interaction.response.send_message("You have no jobs.", ephemeral=True)
+            return
 
-        except Exception as e:
-            await interaction.followup.send(f"Error: {str(e)}")
+        lines = ["Your recent jobs:"]
+        for job in jobs:
+            line = f"#{job['id']} {job['kind']} - {job['status']}"
+            if job['status'] in ('queued', 'running') and job['progress']:
+                line += f" ({job['progress']})"
+            elif job['error']:  # Why it failed, or why a finished answer was not delivered
+                line += f" ({job['error'][:100]})"
+            lines.append(line)
+        await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
+    async def handle_cancel_job_command(self, interaction: discord.Interaction, job_id: int):
+        await interaction.response.send_message(
+            self.job_queue.cancel(job_id, interaction.user.id), ephemeral=True)
 
     def _get_file_icon(self, mime_type: str) -> str:
         """Get an appropriate emoji icon for the file type"""
@@ -299,37 +422,74 @@ Attachments are clearly marked between === Begin Attachment Content === and ===
         except Exception as e:
             await interaction.followup.send(f"Error: {str(e)}")
 
-    async def handle_ask_about_command(self, interaction: discord.Interaction, name: str, question: str):
+    async def handle_ask_about_command(self, interaction: discord.Interaction, name: str, question: str,
+                                       fresh: bool = False):
         try:
             await interaction.response.defer()
 
             # Search for matching files
             files = await self.drive_processor.search_files(name, 'document')
-
             if not files:
                 await interaction.followup.send(f"No files found matching '{name}'")
                 return
 
-            # Get content for each matching file
-            all_content = []
-            for file in files[:5]:  # Limit to first 5 matches to avoid overload
-                content = await self.drive_processor.get_document_content(file['id'])
-                all_content.append(f"=== {file['name']} ===\n{content}\n")
-
-            # Format prompt with all file contents
-            prompt = f"""Found {len(files)} files matching '{name}'. Content of first 5 files:\n\n"""
-            prompt += "\n".join(all_content)
-            prompt += f"\n\nQuestion: {question}"
-
-            # Get Claude's response
-            response = await self.claude_client.get_response(interaction.user.name, prompt, "")
+            matches = files[:5]  # Limit to first 5 matches to avoid overload
+            cache_key = self._cache_key('ask_about', question, matches, str(len(files)))
+            if not fresh and await self._send_cached_answer(interaction, cache_key):
+                return
 
-            await self._send_chunked_response(interaction, response)
+            # Reading up to five documents runs as a background job
+            await self._enqueue_job(interaction, 'ask_about', {
+                'name': name,
+                'question': question,
+                'files': [{'id': file['id'], 'name': file['name']} for file in matches],
+                'total': len(files),
+                'cache_key': cache_key
+            })
         except Exception as e:
             await interaction.followup.send(f"Error: {str(e)}")
 
+    async def run_ask_about_job(self, job: dict, progress) -> str:
+        """Job handler: find files matching a name and ask Claude about them"""
+        payload = job['payload']
+        name, question = payload['name'], payload['question']
+        matches, total = payload.get('files'), payload.get('total')
+
+        if matches is None:
+            # Jobs queued before the search moved into the command still search here
+            await progress(f"Searching Drive for '{name}'")
+            files = await self.drive_processor.search_files(name, 'document')
+            if not files:
+                return f"No files found matching '{name}'"
+            matches, total = files[:5], len(files)
+
+        # Get content for each matching file
+        all_content = []
+        read_failed = False
+        for i, file in enumerate(matches, 1):
+            await progress(f"Reading file {i}/{len(matches)}: {file['name']}")
+            content = await self.drive_processor.get_document_content(file['id'])
+            read_failed = read_failed or self.drive_processor.read_failed(content)
+            all_content.append(f"=== {file['name']} ===\n{content}\n")
+
+        # Format prompt with all file contents
+        prompt = f"""Found {total} files matching '{name}'. Content of first 5 files:\n\n"""
+        prompt += "\n".join(all_content)
+        prompt += f"\n\nQuestion: {question}"
+
+        # Get Claude's response
+        await progress("Waiting for Claude's answer")
+        response = await self.claude_client.get_response(
+            job['user_name'], prompt, "", command='ask_about',
+            guild_id=payload.get('guild_id'), user_question=question)
+        # Never remember an answer about a read that failed
+        if response and payload.get('cache_key') and not read_failed:
+            self.answer_cache.put(payload['cache_key'], response)
+        return response or "Sorry, I couldn't get a response from Claude. Please try again."
+
     async def cleanup(self):
         """Cleanup method to close the aiohttp session"""
         if self.aiohttp_session:
             await self.aiohttp_session.close()
             self.aiohttp_session = None
+        self.history_summarizer.close()
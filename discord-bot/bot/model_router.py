@@ -0,0 +1,120 @@
+import re
+from collections import deque
+
+
+class ModelRouter:
+    """Pick a model tier and output budget for each Claude request.
+
+    Short, simple questions go to a fast model with a small max_tokens; long-form,
+    analytical or document-heavy requests keep the full model. Latency and token
+    usage are tracked per route so the split can be checked against real traffic.
+    """
+
+    TIERS = {
+        'fast': {'model': 'claude-3-5-haiku-latest', 'max_tokens': 1024},
+        'standard': {'model': 'claude-3-5-sonnet-latest', 'max_tokens': 2048},
+        'long': {'model': 'claude-3-5-sonnet-latest', 'max_tokens': 4000}
+    }
+
+    # Requests that need reasoning over content or a long written answer
+    COMPLEX_PATTERN = re.compile(
+        r"\b(summar\w*|analy[sz]\w*|explain\w*|compar\w*|why|how (does|do|can|should|would)|"
+        r"review\w*|debug\w*|plan\w*|evaluat\w*|recommend\w*|pros and cons|trade-?offs?)\b")
+    LONG_FORM_PATTERN = re.compile(
+        r"\b(write|draft|rewrite|code|script|implement\w*|detailed|in detail|step[- ]by[- ]step|"
+        r"essay|report|outline|translate)\b")
+
+    # Where an answer that ran out of output tokens is retried
+    ESCALATION = {'fast': 'standard', 'standard': 'long'}
+
+    # Commands that read several documents always get the full budget
+    MULTI_DOCUMENT_COMMANDS = {'ask_folder', 'ask_about'}
+
+    def __init__(self, guild_overrides: dict = None):
+        # guild id -> tier name, or a dict with 'model' and/or 'max_tokens'
+        self.guild_overrides = guild_overrides or {}
+        self.config = {
+            'FAST_MAX_PROMPT_CHARS': 40000,  # About 10k tokens, room for the channel history
+            'FAST_MAX_QUESTION_WORDS': 25
+        }
+        self.stats = {}  # route name -> counters and recent latencies
+
+    def classify(self, question: str) -> tuple:
+        """Cheap heuristic classification of a question into (kind, reason)"""
+        text = question.lower()
+        if self.LONG_FORM_PATTERN.search(text):
+            return 'long', 'long-form request'
+        if self.COMPLEX_PATTERN.search(text):
+            return 'complex', 'analytical question'
+        if len(text.split()) > self.config['FAST_MAX_QUESTION_WORDS']:
+            return 'complex', 'long question'
+        return 'simple', 'short question'
+
+    def route(self, command: str, question: str, prompt_chars: int, guild_id: int = None,
+              has_attachments: bool = False) -> dict:
+        """Return {'name', 'model', 'max_tokens', 'reason'} for one request"""
+        override = self.guild_overrides.get(guild_id)
+        # Native images and PDFs need the full model, which reads documents; an override cannot go below it
+        fast_model = self.TIERS['fast']['model']
+        if isinstance(override, str) and override in self.TIERS:
+            if has_attachments and self.TIERS[override]['model'] == fast_model:
+                return self._make('standard', f"native attachments (guild override {override} ignored)")
+            return self._make(override, f"guild override ({override})")
+        if isinstance(override, dict):
+            route = self._make('standard', "guild override")
+            route.update({k: v for k, v in override.items() if k in ('model', 'max_tokens')})
+            route['name'] = 'override'
+            if has_attachments and route['model'] == fast_model:
+                route['model'] = self.TIERS['standard']['model']
+                route['reason'] += " (full model for native attachments)"
+            return route
+
+        kind, reason = self.classify(question)
+        if command in self.MULTI_DOCUMENT_COMMANDS:
+            return self._make('long', f"{command} reads several documents")
+        if kind == 'long':
+            return self._make('long', reason)
+        if has_attachments:
+            return self._make('standard', "native attachments")
+        if prompt_chars > self.config['FAST_MAX_PROMPT_CHARS']:
+            return self._make('standard', f"large prompt ({prompt_chars} chars)")
+        if kind == 'complex':
+            return self._make('standard', reason)
+        return self._make('fast', reason)
+
+    def _make(self, tier: str, reason: str) -> dict:
+        return dict(self.TIERS[tier], name=tier, reason=reason)
+
+    def escalate(self, route: dict):
+        """The next larger route for an answer cut off at max_tokens, or None at the top"""
+        tier = self.ESCALATION.get(route['name'])
+        if tier is None:
+            return None
+        return self._make(tier, f"{route['name']} answer hit max_tokens")
+
+    def record(self, route: dict, latency: float, usage=None, stop_reason: str = None):
+        """Log one completed request and add it to the per-route stats"""
+        stats = self.stats.setdefault(route['name'], {
+            'count': 0, 'truncated': 0, 'input_tokens': 0, 'output_tokens': 0, 'latencies': deque(maxlen=500)})
+        stats['count'] += 1
+        if stop_reason == 'max_tokens':
+            stats['truncated'] += 1
+        stats['latencies'].append(latency)
+        input_tokens = getattr(usage, 'input_tokens', 0) or 0
+        output_tokens = getattr(usage, 'output_tokens', 0) or 0
+        stats['input_tokens'] += input_tokens
+        stats['output_tokens'] += output_tokens
+        print(f"Claude route={route['name']} model={route['model']} max_tokens={route['max_tokens']} "
+              f"reason='{route['reason']}' latency={latency * 1000:.0f}ms "
+              f"tokens in={input_tokens} out={output_tokens} stop={stop_reason}")
+
+    def describe(self) -> str:
+        if not self.stats:
+            return "Model routes: no requests yet"
+        parts = []
+        for name, stats in sorted(self.stats.items()):
+            latencies = sorted(stats['latencies'])
+            p50 = latencies[len(latencies) // 2]
+            parts.append(f"{name} {stats['count']} req, p50 {p50:.1f}s, "
+                         f"avg out {stats['output_tokens'] // stats['count']} tok, {stats['truncated']} truncated")
+        return "Model routes: " + "; ".join(parts)
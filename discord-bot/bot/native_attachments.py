@@ -0,0 +1,116 @@
+import base64
+import io
+from .startup import lazy_import
+
+
+class NativeAttachments:
+    """Turn images and PDFs into Claude image/document content blocks instead of extracting text locally.
+
+    Images are downscaled to the size Claude actually looks at and PDFs are cut to a
+    page limit, so requests stay inside the API's size limits. Anything that still
+    does not fit returns None and the caller falls back to local extraction.
+    """
+
+    IMAGE_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'GIF': 'image/gif', 'WEBP': 'image/webp'}
+
+    def __init__(self, max_image_edge: int = 1568, max_pdf_pages: int = 100):
+        self.config = {
+            'MAX_IMAGE_EDGE': max_image_edge,  # Larger images are downscaled by the API anyway
+            # Limits apply to the base64 text in the request, about 4/3 of the raw size
+            'MAX_IMAGE_BYTES': 5 * 1024 * 1024,  # API limit per image
+            'MAX_PDF_PAGES': max_pdf_pages,
+            'MAX_PDF_BYTES': 31 * 1024 * 1024,  # API limit is 32MB per request; leave room for the prompt
+            'JPEG_QUALITY': 85
+        }
+
+    def image_block(self, image_file) -> dict:
+        """Image content block from an image file object - blocking, meant to be run in executor"""
+        Image = lazy_import('PIL.Image')
+        limit = self.config['MAX_IMAGE_EDGE']
+        image_file.seek(0)
+        with Image.open(image_file) as img:
+            media_type = self.IMAGE_TYPES.get(img.format)
+            image_file.seek(0, io.SEEK_END)
+            size = image_file.tell()
+
+            # Pass supported, small-enough images through untouched - no decode at all
+            if media_type and max(img.size) <= limit and self._encoded_size(size) <= self.config['MAX_IMAGE_BYTES']:
+                image_file.seek(0)
+                return self._block('image', media_type, image_file.read())
+
+            # JPEG can decode straight at a reduced scale, which is much cheaper than a full decode
+            img.draft('RGB', (limit, limit))
+            img.thumbnail((limit, limit), Image.Resampling.LANCZOS)
+            has_alpha = img.mode in ('RGBA', 'LA', 'P')
+            output = io.BytesIO()
+            if has_alpha:
+                img.save(output, format='PNG', optimize=True)
+            else:
+                img.convert('RGB').save(output, format='JPEG', quality=self.config['JPEG_QUALITY'])
+
+        data = output.getvalue()
+        if self._encoded_size(len(data)) > self.config['MAX_IMAGE_BYTES']:
+            return None
+        return self._block('image', 'image/png' if has_alpha else 'image/jpeg', data)
+
+    def pdf_block(self, pdf_file) -> tuple:
+        """(document content block, pages left out) from a PDF file object - blocking, meant to be run in executor"""
+        PyPDF2 = lazy_import('PyPDF2')
+        pdf_file.seek(0)
+        reader = PyPDF2.PdfReader(pdf_file)
+        page_count = len(reader.pages)
+        if page_count == 0:
+            return None, 0
+
+        if page_count > self.config['MAX_PDF_PAGES']:
+            # Copy only the first pages rather than sending the whole document
+            writer = PyPDF2.PdfWriter()
+            for page in reader.pages[:self.config['MAX_PDF_PAGES']]:
+                writer.add_page(page)
+            output = io.BytesIO()
+            writer.write(output)
+            data = output.getvalue()
+        else:
+            pdf_file.seek(0)
+            data = pdf_file.read()
+
+        if self._encoded_size(len(data)) > self.config['MAX_PDF_BYTES']:
+            return None, 0
+        return self._block('document', 'application/pdf', data), max(page_count - self.config['MAX_PDF_PAGES'], 0)
+
+    def block_for(self, mime_type: str, file, name: str) -> tuple:
+        """(content block, prompt note) for a PDF or image file object - blocking, meant to be run in executor.
+
+        Returns (None, None) when the file should be extracted locally instead.
+        """
+        try:
+            if mime_type == 'application/pdf':
+                block, omitted = self.pdf_block(file)
+                note = f"The attached PDF document is {name}."
+                if omitted:
+                    note += f" Only its first {self.config['MAX_PDF_PAGES']} pages are included."
+            elif mime_type.startswith('image/'):
+                block = self.image_block(file)
+                note = f"The attached image is {name}."
+            else:
+                return None, None
+        except Exception as e:
+            print(f"Could not prepare {name} for native passthrough: {e}")
+            return None, None
+        return (block, note) if block else (None, None)
+
+    @staticmethod
+    def _encoded_size(nbytes: int) -> int:
+        """Length of nbytes once base64 encoded"""
+        return (nbytes + 2) // 3 * 4
+
+    @staticmethod
+    def _block(kind: str, media_type: str, data: bytes) -> dict:
+        return {
+            'type': kind,
+            'source': {
+                'type': 'base64',
+                'media_type': media_type,
+                'data': base64.standard_b64encode(data).decode('ascii')
+            }
+        }
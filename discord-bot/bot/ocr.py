@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import importlib
+import multiprocessing
+import os
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from .image_index import ImageTextIndex
+from .startup import lazy_import
+
+
+def _ocr_pdf_page(pdf_path: str, page_number: int, dpi: int) -> str:
+    """Rasterize and OCR one PDF page - runs in a worker process"""
+    pdf2image = importlib.import_module('pdf2image')
+    pytesseract = importlib.import_module('pytesseract')
+    images = pdf2image.convert_from_path(
+        pdf_path, dpi=dpi, first_page=page_number, last_page=page_number)
+    if not images:
+        return ""
+    try:
+        return pytesseract.image_to_string(images[0])
+    finally:
+        images[0].close()
+
+
+def _pdf_page_count(pdf_path: str) -> int:
+    return int(importlib.import_module('pdf2image').pdfinfo_from_path(pdf_path)['Pages'])
+
+
+def default_workers(cap: int = 4) -> int:
+    """CPUs this process may run on, capped - containers often report every core of the host"""
+    try:
+        available = len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS
+        available = os.cpu_count() or 1
+    return max(1, min(available, cap))
+
+
+class OcrService:
+    """Optional OCR subsystem - pytesseract is only imported when the first image is read"""
+
+    def __init__(self, pdf_dpi: int = 200, max_workers: int = None, match_distance: int = 4):
+        # Near-duplicate images reuse earlier OCR text instead of running Tesseract again
+        self.image_index = ImageTextIndex(max_distance=match_distance)
+        self.config = {
+            'PDF_DPI': pdf_dpi,
+            # Each worker process imports pdf2image and Tesseract and holds memory outside the budget
+            'MAX_WORKERS': max_workers or default_workers(),
+            'MAX_PDF_PAGES': 200,
+            'PAGE_CACHE_SIZE': 2000
+        }
+        self._pool = None  # Started on the first scanned PDF
+        self._page_cache = OrderedDict()  # (pdf digest, page, dpi) -> text
+
+    def image_to_text(self, img) -> str:
+        """Run OCR on a PIL image - blocking, meant to be run in executor"""
+        signature, text = self.image_index.lookup(img)
+        if text is not None:
+            return text
+
+        pytesseract = lazy_import('pytesseract')
+        text = pytesseract.image_to_string(img)
+        self.image_index.add(signature, text)
+        return text
+
+    def page_raster_bytes(self) -> int:
+        """Rough memory for one rasterized US Letter page plus Tesseract's working copy"""
+        dpi = self.config['PDF_DPI']
+        return int(8.5 * dpi) * int(11 * dpi) * 3 * 2
+
+    async def pdf_to_text(self, pdf_file, max_chars: int, memory_budget=None) -> str:
+        """OCR a PDF without a text layer, page by page across a process pool.
+
+        Pages are OCRed in parallel but collected in order, and no new pages are
+        started once max_chars of text has been gathered.
+        """
+        loop = asyncio.get_running_loop()
+        pdf_path, digest = await loop.run_in_executor(None, self._write_temp_pdf, pdf_file)
+        try:
+            if self._pool is None:
+                # Spawned workers avoid forking a process that already runs threads
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.config['MAX_WORKERS'],
+                    mp_context=multiprocessing.get_context('spawn'))
+
+            page_count = await loop.run_in_executor(self._pool, _pdf_page_count, pdf_path)
+            page_count = min(page_count, self.config['MAX_PDF_PAGES'])
+            dpi = self.config['PDF_DPI']
+
+            async def ocr_page(page_number):
+                key = (digest, page_number, dpi)
+                if key in self._page_cache:
+                    self._page_cache.move_to_end(key)
+                    return self._page_cache[key]
+                if memory_budget is not None:
+                    async with memory_budget.reserve(self.page_raster_bytes()):
+                        text = await loop.run_in_executor(self._pool, _ocr_pdf_page, pdf_path, page_number, dpi)
+                else:
+                    text = await loop.run_in_executor(self._pool, _ocr_pdf_page, pdf_path, page_number, dpi)
+                self._cache_page(key, text)
+                return text
+
+            parts = []
+            total = 0
+            in_flight = {}
+            next_page = 1
+            try:
+                for page_number in range(1, page_count + 1):
+                    # Keep every worker busy a few pages ahead of the page being collected
+                    while next_page <= page_count and len(in_flight) < self.config['MAX_WORKERS']:
+                        in_flight[next_page] = asyncio.ensure_future(ocr_page(next_page))
+                        next_page += 1
+
+                    text = (await in_flight.pop(page_number)).strip()
+                    if text:
+                        parts.append(f"[Page {page_number}]\n{text}")
+                        total += len(parts[-1])
+                    if total >= max_chars:
+                        break
+            finally:
+                # Pages past the content budget are not needed
+                for task in in_flight.values():
+                    task.cancel()
+
+            if not parts:
+                return "[Scanned PDF - no text found by OCR]"
+            return "\n\n".join(parts)
+
+        finally:
+            try:
+                os.unlink(pdf_path)
+            except OSError:
+                pass
+
+    def _write_temp_pdf(self, pdf_file):
+        """Copy a PDF file object to disk for the worker processes and hash it on the way"""
+        pdf_file.seek(0)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_pdf:
+            while True:
+                block = pdf_file.read(1024 * 1024)
+                if not block:
+                    break
+                digest.update(block)
+                temp_pdf.write(block)
+        return temp_pdf.name, digest.hexdigest()
+
+    def _cache_page(self, key, text: str):
+        self._page_cache[key] = text
+        self._page_cache.move_to_end(key)
+        while len(self._page_cache) > self.config['PAGE_CACHE_SIZE']:
+            self._page_cache.popitem(last=False)
+
+    def shutdown(self, wait: bool = False):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pool = None
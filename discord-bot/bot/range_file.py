@@ -0,0 +1,131 @@
+import io
+from collections import OrderedDict
+from .startup import lazy_import
+
+
+# Page attributes a page takes from its ancestors in the page tree when it has none itself
+INHERITABLE_PAGE_ATTRIBUTES = ('/Resources', '/MediaBox', '/CropBox', '/Rotate')
+
+
+def pdf_pages(reader):
+    """Yield the pages of a PyPDF2 PdfReader in order, resolving each only when it is reached.
+
+    reader.pages flattens the whole page tree the first time it is touched, which reads
+    every page object in the file. On a RangeFile that fetches blocks from all over a
+    large PDF, so walk /Kids here instead and stop fetching when the caller stops reading.
+    """
+    PyPDF2 = lazy_import('PyPDF2')
+    generic = PyPDF2.generic
+
+    def walk(reference, inherited):
+        node = reference.get_object()
+        if node.get('/Type', '/Pages') == '/Pages':
+            inherited = dict(inherited)
+            for attribute in INHERITABLE_PAGE_ATTRIBUTES:
+                if attribute in node:
+                    inherited[attribute] = node[attribute]
+            for kid in node['/Kids']:
+                yield from walk(kid, inherited)
+            return
+
+        page = PyPDF2.PageObject(
+            reader, reference if isinstance(reference, generic.IndirectObject) else None)
+        page.update(node)
+        for attribute, value in inherited.items():
+            if attribute not in page:
+                page[generic.NameObject(attribute)] = value
+        yield page
+
+    yield from walk(reader.trailer['/Root']['/Pages'], {})
+
+
+class RangeFile(io.RawIOBase):
+    """Read-only, seekable file object that fetches byte ranges on demand.
+
+    Reads are served from fixed-size blocks kept in a small LRU cache; a miss fetches
+    every missing block of the read in one ranged request. Blocks are small because
+    most PDF reads are small objects scattered through the file, while a content
+    stream is read in one call and so still arrives in a single request. With
+    pdf_pages, PdfReader fetches the trailer, the xref and the objects of the pages it
+    extracts rather than the whole file.
+    """
+
+    def __init__(self, fetch, size: int, block_size: int = 32 * 1024, max_blocks: int = 512):
+        # fetch(start, end) returns bytes start..end inclusive - blocking, like every read
+        self._fetch = fetch
+        self.size = size
+        self.block_size = block_size
+        self.max_blocks = max_blocks
+        self._blocks = OrderedDict()  # block index -> bytes
+        self._position = 0
+        self.bytes_fetched = 0
+        self.requests = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if position < 0:
+            raise ValueError("Negative seek position")
+        self._position = position
+        return position
+
+    def readinto(self, buffer) -> int:
+        end = min(self._position + len(buffer), self.size)
+        if self._position >= end:
+            return 0
+
+        first = self._position // self.block_size
+        last = (end - 1) // self.block_size
+        self._load(first, last)
+
+        view = memoryview(buffer)
+        written = 0
+        for index in range(first, last + 1):
+            block = self._blocks[index]
+            block_start = index * self.block_size
+            start = max(self._position, block_start) - block_start
+            stop = min(end, block_start + len(block)) - block_start
+            view[written:written + stop - start] = block[start:stop]
+            written += stop - start
+        self._position += written
+        return written
+
+    def _load(self, first: int, last: int):
+        """Fetch the missing blocks between first and last, one request per contiguous run"""
+        index = first
+        while index <= last:
+            if index in self._blocks:
+                index += 1
+                continue
+            run_end = index
+            while run_end + 1 <= last and run_end + 1 not in self._blocks:
+                run_end += 1
+
+            start = index * self.block_size
+            data = self._fetch(start, min((run_end + 1) * self.block_size, self.size) - 1)
+            self.requests += 1
+            self.bytes_fetched += len(data)
+            for offset, block_index in enumerate(range(index, run_end + 1)):
+                self._blocks[block_index] = data[offset * self.block_size:(offset + 1) * self.block_size]
+            index = run_end + 1
+
+        # Evict least recently used blocks, but never the ones this read needs
+        for index in range(first, last + 1):
+            self._blocks.move_to_end(index)
+        while len(self._blocks) > max(self.max_blocks, last - first + 1):
+            self._blocks.popitem(last=False)
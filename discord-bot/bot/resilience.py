@@ -0,0 +1,188 @@
+import asyncio
+import random
+import time
+from collections import defaultdict, deque
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend whose circuit breaker is open"""
+
+
+class RetryBudget:
+    """Token bucket shared by all backends that caps retries to a fraction of normal traffic.
+
+    Every first attempt deposits `ratio` tokens and every retry or hedge spends one, so
+    a failing backend cannot multiply the load on itself with a storm of retries.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 0.5, max_tokens: float = 20):
+        self.ratio = ratio
+        self.min_per_second = min_per_second  # Lets low-traffic periods still retry
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self._updated = time.monotonic()
+        self.spent = 0
+        self.denied = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.max_tokens, self.tokens + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def deposit(self):
+        self._refill()
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            self.spent += 1
+            return True
+        self.denied += 1
+        return False
+
+
+class CircuitBreaker:
+    """Stop calling a backend after repeated failures and probe it again after a cool-off"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe_at = 0.0
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        if self.state == 'open' and now - self._opened_at >= self.reset_timeout:
+            self.state = 'half-open'  # Let a single probe through
+            self._probe_at = now
+            return True
+        if self.state == 'half-open' and now - self._probe_at >= self.reset_timeout:
+            # The last probe never reported back, so let another one through
+            self._probe_at = now
+            return True
+        return self.state == 'closed'
+
+    def record_success(self):
+        self.state = 'closed'
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == 'half-open' or self.failures >= self.failure_threshold:
+            self.state = 'open'
+            self._opened_at = time.monotonic()
+
+
+class Backend:
+    """Retry, backoff, circuit breaking and hedging policy for one remote backend"""
+
+    def __init__(self, name: str, retry_budget: RetryBudget, max_attempts: int = 4,
+                 base_delay: float = 0.5, max_delay: float = 8.0):
+        self.name = name
+        self.retry_budget = retry_budget
+        self.breaker = CircuitBreaker()
+        self.config = {
+            'MAX_ATTEMPTS': max_attempts,
+            'BASE_DELAY': base_delay,
+            'MAX_DELAY': max_delay,
+            'MIN_HEDGE_SAMPLES': 20  # Latencies needed before p95 is trusted
+        }
+        # operation -> recent latencies; a quick lookup and a bulk listing never share a p95
+        self._latencies = defaultdict(lambda: deque(maxlen=200))
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    async def call(self, fn, is_retryable):
+        """Await fn() with jittered exponential backoff on retryable errors.
+
+        Retries stop when attempts run out, the error is not retryable, or the shared
+        retry budget is empty. Raises CircuitOpenError while the breaker is open.
+        """
+        self.retry_budget.deposit()
+        for attempt in range(self.config['MAX_ATTEMPTS']):
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"{self.name} is temporarily unavailable after repeated failures")
+            try:
+                result = await fn()
+                self.breaker.record_success()
+                return result
+            except asyncio.CancelledError:
+                # A cancelled probe proved nothing; reopen so the next probe is not blocked forever
+                if self.breaker.state == 'half-open':
+                    self.breaker.record_failure()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    # The backend answered, it just refused this request
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if attempt == self.config['MAX_ATTEMPTS'] - 1 or not self.retry_budget.try_spend():
+                    raise
+                self.retries += 1
+                # Full jitter keeps retrying clients from synchronizing
+                ceiling = min(self.config['MAX_DELAY'], self.config['BASE_DELAY'] * 2 ** attempt)
+                delay = random.uniform(0, ceiling)
+                print(f"{self.name} call failed ({e}), retry {attempt + 1} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def p95(self, operation: str = None):
+        latencies = self._latencies.get(operation)
+        if latencies is None or len(latencies) < self.config['MIN_HEDGE_SAMPLES']:
+            return None
+        ordered = sorted(latencies)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+    async def hedged(self, fn, operation: str = None):
+        """Await fn(), sending a second identical request if the first is slower than p95.
+
+        Only for idempotent calls. operation names the kind of call, and each kind is
+        measured against its own p95. The first successful response wins; hedges spend
+        from the retry budget so they cannot turn into a storm.
+        """
+        started = time.monotonic()
+        delay = self.p95(operation)
+        pending = set()
+        error = None
+        try:
+            first = asyncio.ensure_future(fn())
+            pending.add(first)
+
+            if delay is not None:
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                if not done and self.retry_budget.try_spend():
+                    self.hedges += 1
+                    pending.add(asyncio.ensure_future(fn()))
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.hedge_wins += 1
+                        self._latencies[operation].append(time.monotonic() - started)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def describe(self) -> str:
+        p95s = []
+        for operation in sorted(self._latencies, key=str):
+            p95 = self.p95(operation)
+            if p95 is not None:
+                p95s.append(f"{operation or 'other'} {p95 * 1000:.0f}ms")
+        p95_text = ", ".join(p95s)
+        return (f"{self.name}: breaker {self.breaker.state}, {self.retries} retries, "
+                f"{self.hedges} hedges ({self.hedge_wins} won), p95 {p95_text or 'n/a'}")
+
+
+# One budget for the whole process, shared by every backend
+retry_budget = RetryBudget()
@@ -0,0 +1,209 @@
+import asyncio
+import io
+import time
+from collections import deque
+
+import discord
+
+
+class ResponseFormatter:
+    """Split answers on markdown structure and pack them into as few Discord messages as possible"""
+
+    MESSAGE_LIMIT = 2000
+    EMBED_LIMIT = 4096
+    EMBED_TOTAL_LIMIT = 6000  # Discord caps the combined size of all embeds in one message
+    MAX_EMBEDS = 10
+    FENCE_CLOSE = "\n```"
+
+    def __init__(self):
+        self.config = {
+            'MAX_EMBED_MESSAGES': 2,  # Longer answers go out as a single .md attachment
+            'PREVIEW_LENGTH': 1500,
+            'ATTACHMENT_NAME': 'answer.md'
+        }
+
+    def split(self, text: str, limit: int) -> list:
+        """Split text into non-empty chunks of at most `limit` characters in one pass.
+
+        Breaks prefer blank lines between blocks, then line ends, then spaces. A code
+        block that straddles a break is closed and reopened so each chunk renders on its own.
+        """
+        # Leave room for closing and reopening a code fence around every chunk
+        budget = limit - len(self.FENCE_CLOSE)
+        chunks = []
+        pending = []  # (line, open fence after this line)
+        size = 0
+        fence = None
+        last_blank = -1  # Index in pending of the last blank line outside a code block
+
+        def emit(count):
+            nonlocal pending, size, last_blank
+            head, tail = pending[:count], pending[count:]
+            open_fence = head[-1][1] if head else None
+            body = "\n".join(line for line, _ in head).strip("\n")
+            if body.strip() and body.strip() != open_fence:
+                chunks.append(body + self.FENCE_CLOSE if open_fence else body)
+
+            pending, size, last_blank = [], 0, -1
+            if open_fence:
+                pending.append((open_fence, open_fence))
+                size = len(open_fence) + 1
+            # Carried lines follow the last blank line, so none of them is a break point
+            for line, line_fence in tail:
+                pending.append((line, line_fence))
+                size += len(line) + 1
+
+        for line in self._wrap_lines(text, max(budget - 100, limit // 2)):
+            new_fence = fence
+            if line.lstrip().startswith("```"):
+                new_fence = None if fence else line.strip()
+
+            # A closing fence may use the room reserved for closing the block
+            room = limit if fence and new_fence is None else budget
+            if pending and size + len(line) + 1 > room:
+                emit(last_blank + 1 if last_blank >= 0 else len(pending))
+                if pending and size + len(line) + 1 > budget:
+                    emit(len(pending))
+
+            pending.append((line, new_fence))
+            size += len(line) + 1
+            fence = new_fence
+            if not line.strip() and fence is None:
+                last_blank = len(pending) - 1
+
+        if pending:
+            emit(len(pending))
+        return chunks
+
+    def _wrap_lines(self, text: str, width: int):
+        """Yield lines of text, hard-wrapping any line longer than width at a space if possible"""
+        for line in text.split("\n"):
+            while len(line) > width:
+                cut = line.rfind(" ", 0, width)
+                if cut <= 0:
+                    cut = width
+                yield line[:cut]
+                line = line[cut:].lstrip(" ")
+            yield line
+
+    def pack(self, text: str, prefix: str = "") -> list:
+        """Return send() keyword arguments for each message needed to deliver text.
+
+        prefix is plain text for the start of the first message, kept in its content
+        rather than an embed so that mentions in it notify.
+        """
+        text = text.strip()
+        if not prefix:
+            return self._pack(text, self.MESSAGE_LIMIT)
+        messages = self._pack(text, self.MESSAGE_LIMIT - len(prefix) - 2)
+        first = messages[0]
+        first['content'] = f"{prefix}\n\n{first['content']}" if first.get('content') else prefix
+        return messages
+
+    def _pack(self, text: str, content_limit: int) -> list:
+        if len(text) <= content_limit:
+            return [{'content': text}]
+
+        if len(text) <= self.EMBED_LIMIT:
+            return [{'embeds': [discord.Embed(description=text)]}]
+
+        # Half the per-message total lets two full embeds share a message
+        chunks = self.split(text, self.EMBED_TOTAL_LIMIT // 2)
+        messages = []
+        current, current_size = [], 0
+        for chunk in chunks:
+            if current and (current_size + len(chunk) > self.EMBED_TOTAL_LIMIT or len(current) >= self.MAX_EMBEDS):
+                messages.append(current)
+                current, current_size = [], 0
+            current.append(discord.Embed(description=chunk))
+            current_size += len(chunk)
+        if current:
+            messages.append(current)
+
+        if len(messages) <= self.config['MAX_EMBED_MESSAGES']:
+            return [{'embeds': embeds} for embeds in messages]
+
+        # Very long answer: a short preview plus the whole answer as a markdown file; the
+        # preview is short enough to leave room for a prefix
+        preview = self.split(text, self.config['PREVIEW_LENGTH'])[0]
+        note = f"\n\n*Full answer ({len(text):,} characters) attached as `{self.config['ATTACHMENT_NAME']}`.*"
+        return [{
+            'content': preview + note,
+            'file': discord.File(io.BytesIO(text.encode('utf-8')), filename=self.config['ATTACHMENT_NAME'])
+        }]
+
+
+class ResponseSender:
+    """Send formatted answers through a per-channel queue that stays inside Discord's rate limits"""
+
+    def __init__(self, formatter: ResponseFormatter = None):
+        self.formatter = formatter or ResponseFormatter()
+        self.config = {
+            # Discord's per-channel message bucket allows 5 sends per 5 seconds
+            'BUCKET_SIZE': 5,
+            'BUCKET_WINDOW': 5.0,
+            'WORKER_IDLE_SECONDS': 60
+        }
+        self._queues = {}
+        self._workers = {}
+        self._sent = {}  # channel id -> timestamps of recent sends
+
+    async def send_interaction(self, interaction, text: str):
+        """Send an answer as followups to a deferred interaction"""
+        await self.deliver(interaction.followup, interaction.channel_id, text)
+
+    async def send_channel(self, channel, text: str, prefix: str = ""):
+        """Send an answer as regular channel messages, the first starting with prefix"""
+        await self.deliver(channel, channel.id, text, prefix)
+
+    async def deliver(self, target, channel_id: int, text: str, prefix: str = ""):
+        """Queue every message of one answer back to back and wait until all are sent"""
+        loop = asyncio.get_running_loop()
+        queue = self._queues.get(channel_id)
+        if queue is None:
+            queue = self._queues[channel_id] = asyncio.Queue()
+
+        futures = []
+        for kwargs in self.formatter.pack(text, prefix):
+            future = loop.create_future()
+            queue.put_nowait((target, kwargs, future))
+            futures.append(future)
+
+        worker = self._workers.get(channel_id)
+        if worker is None or worker.done():
+            self._workers[channel_id] = asyncio.create_task(self._run_worker(channel_id, queue))
+
+        await asyncio.gather(*futures)
+
+    async def _run_worker(self, channel_id: int, queue: asyncio.Queue):
+        sent = self._sent.setdefault(channel_id, deque())
+        while True:
+            try:
+                target, kwargs, future = await asyncio.wait_for(
+                    queue.get(), timeout=self.config['WORKER_IDLE_SECONDS'])
+            except asyncio.TimeoutError:
+                if queue.empty():
+                    # Idle channels release their queue and worker
+                    self._queues.pop(channel_id, None)
+                    self._workers.pop(channel_id, None)
+                    self._sent.pop(channel_id, None)
+                    return
+                continue
+
+            # Wait for a slot in the channel bucket instead of tripping a 429
+            now = time.monotonic()
+            while sent and now - sent[0] > self.config['BUCKET_WINDOW']:
+                sent.popleft()
+            if len(sent) >= self.config['BUCKET_SIZE']:
+                await asyncio.sleep(self.config['BUCKET_WINDOW'] - (now - sent[0]))
+                sent.popleft()
+
+            try:
+                await target.send(**kwargs)
+                if not future.done():
+                    future.set_result(None)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                sent.append(time.monotonic())
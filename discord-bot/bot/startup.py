@@ -0,0 +1,56 @@
+import importlib
+import sys
+import time
+from pathlib import Path
+
+
+class StartupTimer:
+    """Record how long each cold-start phase takes so regressions show up in the logs"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases = []  # (name, seconds)
+        self.lazy_imports = {}  # module name -> seconds spent on first import
+        self.reported = False
+
+    def mark(self, phase: str):
+        """Close the current phase under the given name"""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def report(self) -> str:
+        lines = ["Startup time breakdown:"]
+        for name, seconds in self.phases:
+            lines.append(f"  {name:<22} {seconds * 1000:8.1f}ms")
+        lines.append(f"  {'total':<22} {(self._last - self.started) * 1000:8.1f}ms")
+        if self.lazy_imports:
+            lines.append("Lazy imports so far:")
+            for name, seconds in sorted(self.lazy_imports.items(), key=lambda item: -item[1]):
+                lines.append(f"  {name:<22} {seconds * 1000:8.1f}ms")
+        return "\n".join(lines)
+
+
+# Created when the package is first imported, before any heavy dependency
+startup_timer = StartupTimer()
+
+# Databases and profiles live in data/ next to the credentials directory
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+
+
+def resolve_data_dir(path: str = None) -> Path:
+    """The data directory a component was given, or DATA_DIR by default"""
+    return DATA_DIR if path is None else Path(path)
+
+
+def lazy_import(name: str):
+    """Import a module on first use and record what the import cost"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    startup_timer.lazy_imports[name] = time.perf_counter() - started
+    return module
@@ -0,0 +1,79 @@
+import io
+import random
+import unittest
+
+from bot.image_index import BKTree, ImageTextIndex, dhash
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:
+    Image = None
+
+
+def invoice(amounts: list, edited_line: int = None):
+    """A 1200x800 screenshot of a 30-line invoice, the layout that fooled the hash on its own"""
+    img = Image.new('RGB', (1200, 800), 'white')
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default(size=18)
+    for line, amount in enumerate(amounts):
+        label = "travel expenses" if line == edited_line else "consulting services"
+        draw.text((40, 20 + line * 25), f"Item {line + 1:02d} {label}", fill='black', font=font)
+        draw.text((900, 20 + line * 25), f"${amount:,.2f}", fill='black', font=font)
+    return img
+
+
+class BKTreeTest(unittest.TestCase):
+    def test_entries_with_the_same_hash_are_all_kept(self):
+        tree = BKTree()
+        tree.add(0b1010, 'first')
+        tree.add(0b1010, 'second')
+        tree.add(0b1011, 'near')
+        tree.add(0b0101, 'far')
+        self.assertEqual(tree.within(0b1010, 1), [(0, 'second'), (0, 'first'), (1, 'near')])
+
+
+@unittest.skipIf(Image is None, "Pillow is not installed")
+class ImageTextIndexTest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(7)
+        self.amounts = [rng.uniform(10, 9999) for _ in range(30)]
+        self.original = invoice(self.amounts)
+        self.index = ImageTextIndex()
+        signature, text = self.index.lookup(self.original)
+        self.assertIsNone(text)
+        self.index.add(signature, "original invoice")
+
+    def assert_miss(self, img):
+        # The hash alone would have matched; the confirmation has to turn it down
+        self.assertLessEqual((dhash(img) ^ dhash(self.original)).bit_count(), self.index.config['MAX_DISTANCE'])
+        self.assertIsNone(self.index.lookup(img)[1])
+
+    def test_same_layout_with_other_amounts_misses(self):
+        rng = random.Random(8)
+        self.assert_miss(invoice([rng.uniform(10, 9999) for _ in range(30)]))
+
+    def test_one_edited_line_misses(self):
+        self.assert_miss(invoice(self.amounts, edited_line=5))
+
+    def test_one_changed_amount_misses(self):
+        amounts = list(self.amounts)
+        amounts[7] += 0.01
+        self.assert_miss(invoice(amounts))
+
+    def test_reencoded_copy_hits(self):
+        output = io.BytesIO()
+        self.original.save(output, format='JPEG', quality=60)
+        output.seek(0)
+        with Image.open(output) as img:
+            self.assertEqual(self.index.lookup(img)[1], "original invoice")
+
+    def test_slight_crops_hit(self):
+        for box in [(10, 10, 1190, 790), (20, 20, 1180, 780), (0, 13, 1193, 800)]:
+            self.assertEqual(self.index.lookup(self.original.crop(box))[1], "original invoice", box)
+
+    def test_larger_crops_miss(self):
+        self.assertIsNone(self.index.lookup(self.original.crop((0, 0, 1200, 700)))[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+
+from bot.model_router import ModelRouter
+
+
+class AttachmentFloorTest(unittest.TestCase):
+    def test_attachments_leave_the_fast_tier(self):
+        route = ModelRouter().route('ask', "what is this?", 100, has_attachments=True)
+        self.assertEqual(route['name'], 'standard')
+
+    def test_fast_guild_override_is_ignored_for_attachments(self):
+        router = ModelRouter({1: 'fast'})
+        self.assertEqual(router.route('ask', "what is this?", 100, guild_id=1)['name'], 'fast')
+        route = router.route('ask', "what is this?", 100, guild_id=1, has_attachments=True)
+        self.assertEqual(route['name'], 'standard')
+
+    def test_custom_override_keeps_its_budget_but_not_the_fast_model(self):
+        router = ModelRouter({1: {'model': ModelRouter.TIERS['fast']['model'], 'max_tokens': 500}})
+        route = router.route('ask', "what is this?", 100, guild_id=1, has_attachments=True)
+        self.assertEqual(route['model'], ModelRouter.TIERS['standard']['model'])
+        self.assertEqual(route['max_tokens'], 500)
+
+    def test_larger_overrides_apply_to_attachments(self):
+        route = ModelRouter({1: 'long'}).route('ask', "what is this?", 100, guild_id=1, has_attachments=True)
+        self.assertEqual(route['name'], 'long')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import io
+import os
+import unittest
+
+from bot.range_file import RangeFile, pdf_pages
+
+try:
+    import PyPDF2
+except ImportError:
+    PyPDF2 = None
+
+
+def build_pdf(page_count: int, image_bytes: int = 0, inherit_resources: bool = False) -> bytes:
+    """A PDF whose page objects sit between large image streams, as scanners and exporters write them"""
+    font = b"/Font << /F1 3 0 R >>"
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    }
+    kids = []
+    number = 4
+    for page in range(page_count):
+        page_id, content_id, image_id = number, number + 1, number + 2
+        number += 3 if image_bytes else 2
+        kids.append(page_id)
+
+        content = b"BT /F1 12 Tf 72 720 Td (Page %d text) Tj ET" % (page + 1)
+        resources = b"" if inherit_resources else b"/Resources << %s >>" % font
+        if image_bytes:
+            content += b" q 100 0 0 100 72 500 cm /Im0 Do Q"
+            resources = b"/Resources << %s /XObject << /Im0 %d 0 R >> >>" % (font, image_id)
+            data = os.urandom(image_bytes)
+            objects[image_id] = (
+                b"<< /Type /XObject /Subtype /Image /Width %d /Height 1 /ColorSpace /DeviceGray "
+                b"/BitsPerComponent 8 /Length %d >>\nstream\n%s\nendstream" % (image_bytes, len(data), data))
+        objects[page_id] = (b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents %d 0 R %s >>"
+                            % (content_id, resources))
+        objects[content_id] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content)
+
+    inherited = b"/Resources << %s >>" % font if inherit_resources else b""
+    objects[2] = b"<< /Type /Pages /Kids [%s] /Count %d %s >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), page_count, inherited)
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in range(1, number):
+        offsets[object_id] = len(output)
+        output += b"%d 0 obj\n%s\nendobj\n" % (object_id, objects[object_id])
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % number
+    for object_id in range(1, number):
+        output += b"%010d 00000 n \n" % offsets[object_id]
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (number, xref)
+    return bytes(output)
+
+
+class RangeFileTest(unittest.TestCase):
+    def test_reads_match_the_underlying_bytes(self):
+        data = os.urandom(300 * 1024 + 17)
+        range_file = RangeFile(lambda start, end: data[start:end + 1], len(data), block_size=4096, max_blocks=8)
+        for offset, length in [(0, 10), (4090, 20), (100000, 50000), (len(data) - 5, 100), (7, 4096 * 12)]:
+            range_file.seek(offset)
+            self.assertEqual(range_file.read(length), data[offset:offset + length])
+
+    def test_contiguous_misses_share_one_request(self):
+        data = bytes(range(256)) * 1024
+        range_file = RangeFile(lambda start, end: data[start:end + 1], len(data), block_size=4096)
+        range_file.read(40000)
+        self.assertEqual(range_file.requests, 1)
+        range_file.seek(0)
+        range_file.read(40000)
+        self.assertEqual(range_file.requests, 1)
+
+
+@unittest.skipIf(PyPDF2 is None, "PyPDF2 is not installed")
+class PdfPagesTest(unittest.TestCase):
+    def test_first_pages_fetch_a_small_part_of_an_interleaved_pdf(self):
+        data = build_pdf(60, image_bytes=140 * 1024)
+        range_file = RangeFile(lambda start, end: data[start:end + 1], len(data))
+        pages = pdf_pages(PyPDF2.PdfReader(range_file))
+        self.assertIn("Page 1 text", next(pages).extract_text())
+        self.assertIn("Page 2 text", next(pages).extract_text())
+
+        # The two pages' images are read for their Do operators; nothing past them is
+        self.assertLess(range_file.bytes_fetched, len(data) // 10)
+        self.assertLessEqual(range_file.requests, 8)
+
+    def test_walks_every_page_in_order_with_inherited_resources(self):
+        data = build_pdf(12, inherit_resources=True)
+        texts = [page.extract_text() for page in pdf_pages(PyPDF2.PdfReader(io.BytesIO(data)))]
+        self.assertEqual(len(texts), 12)
+        for number, text in enumerate(texts, start=1):
+            self.assertIn(f"Page {number} text", text)
+
+
+if __name__ == '__main__':
+    unittest.main()
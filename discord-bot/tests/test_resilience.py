@@ -0,0 +1,125 @@
+import asyncio
+import time
+import unittest
+
+from bot.resilience import Backend, CircuitBreaker, CircuitOpenError, RetryBudget
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def trip(self, breaker):
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+
+    def test_probe_after_reset_timeout(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        self.trip(breaker)
+        self.assertFalse(breaker.allow())
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, 'half-open')
+        self.assertFalse(breaker.allow())  # Only one probe at a time
+        breaker.record_success()
+        self.assertTrue(breaker.allow())
+
+    def test_unreported_probe_is_replaced(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        self.trip(breaker)
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        # The probe never records success or failure
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+
+
+class BackendCancellationTest(unittest.TestCase):
+    def test_cancelled_probe_does_not_wedge_breaker(self):
+        async def scenario():
+            backend = Backend('Test', RetryBudget(), max_attempts=1)
+            backend.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+
+            async def fail():
+                raise ConnectionError("down")
+
+            with self.assertRaises(ConnectionError):
+                await backend.call(fail, lambda e: True)
+            with self.assertRaises(CircuitOpenError):
+                await backend.call(fail, lambda e: True)
+
+            await asyncio.sleep(0.06)
+            probe = asyncio.ensure_future(backend.call(lambda: asyncio.sleep(10), lambda e: True))
+            await asyncio.sleep(0)
+            probe.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await probe
+
+            await asyncio.sleep(0.06)
+
+            async def ok():
+                return 'ok'
+
+            self.assertEqual(await backend.call(ok, lambda e: True), 'ok')
+            self.assertEqual(backend.breaker.state, 'closed')
+
+        asyncio.run(scenario())
+
+
+class HedgingTest(unittest.TestCase):
+    def test_latencies_are_kept_per_operation(self):
+        backend = Backend('Test', RetryBudget())
+        for _ in range(backend.config['MIN_HEDGE_SAMPLES']):
+            backend._latencies['files.get'].append(0.1)
+            backend._latencies['files.export'].append(5.0)
+        self.assertEqual(backend.p95('files.get'), 0.1)
+        self.assertEqual(backend.p95('files.export'), 5.0)
+        self.assertIsNone(backend.p95('files.list'))
+
+    def test_slow_call_is_hedged_against_its_own_p95(self):
+        async def scenario():
+            backend = Backend('Test', RetryBudget())
+            for _ in range(backend.config['MIN_HEDGE_SAMPLES']):
+                backend._latencies['quick'].append(0.01)
+            calls = []
+
+            async def request():
+                calls.append(None)
+                await asyncio.sleep(0.2 if len(calls) == 1 else 0)
+                return len(calls)
+
+            self.assertEqual(await backend.hedged(request, 'quick'), 2)
+            self.assertEqual(backend.hedge_wins, 1)
+
+            calls.clear()
+            self.assertEqual(await backend.hedged(request, 'bulk'), 1)  # No p95 yet, so no hedge
+            self.assertEqual(len(calls), 1)
+
+        asyncio.run(scenario())
+
+    def test_cancelling_the_caller_cancels_the_first_request(self):
+        async def scenario():
+            backend = Backend('Test', RetryBudget())
+            for _ in range(backend.config['MIN_HEDGE_SAMPLES']):
+                backend._latencies['quick'].append(10)
+            started = asyncio.Event()
+            cancelled = asyncio.Event()
+
+            async def request():
+                started.set()
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    cancelled.set()
+                    raise
+
+            caller = asyncio.ensure_future(backend.hedged(request, 'quick'))
+            await started.wait()  # The caller is now in its initial wait for the p95 delay
+            caller.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await caller
+            await asyncio.wait_for(cancelled.wait(), 1)
+
+        asyncio.run(scenario())
+
+
+if __name__ == '__main__':
+    unittest.main()